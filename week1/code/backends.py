@@ -0,0 +1,98 @@
+"""Assembler backends behind one interface.
+
+A backend is built with backend(k, data_list), get_longest_contig()
+returns the next longest contig or None once the graph is used up, and
+stats() returns a dict with at least the node and edge counts. A backend
+registered with differs gives other contigs than dbg on purpose, differs
+says why.
+"""
+import dbg_codon_simple
+import dbg_kmer_as_key
+from dbg import DBG, REBUILD
+
+BACKENDS = {}
+DIFFERENCES = {}
+
+
+def register(name, differs=None):
+    def wrap(factory):
+        BACKENDS[name] = factory
+        if differs is not None:
+            DIFFERENCES[name] = differs
+        return factory
+    return wrap
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError('unknown backend %r, expected one of %s' % (name, ', '.join(BACKENDS)))
+    return BACKENDS[name]
+
+
+register('dbg')(DBG)
+
+
+@register('kmer-as-key')
+class KmerAsKeyBackend(dbg_kmer_as_key.DBG):
+    """String k-mers as node keys, full depth recompute for every contig"""
+
+    def __init__(self, k, data_list):
+        # its _check indexes the first read, streams are read into lists
+        super().__init__(k, [list(data) for data in data_list])
+
+    def stats(self):
+        return {'nodes': len(self.nodes), 'edges': sum(len(node._children) for node in self.nodes.values())}
+
+
+@register('codon-simple')
+class CodonSimpleBackend:
+    """The functional graph of dbg_codon_simple, adjacency lists keyed by k-mer.
+
+    DBG takes children of equal count in the order its set of child ids
+    iterates, rebuilt after every contig. The list of a k-mer with such
+    children is kept in that order, from a set of first-seen ids rebuilt
+    as DBG's is, so contigs are DBG's.
+    """
+
+    def __init__(self, k, data_list):
+        self.k = k
+        self.graph, self.counts = dbg_codon_simple.build_graph(data_list, k)
+        self.parents = dbg_codon_simple.build_parents(self.graph)
+        # k-mers are first seen in the order DBG numbers them
+        self.kmers = list(self.graph)
+        self.ids = {kmer: idx for idx, kmer in enumerate(self.kmers)}
+        self.tie_sets = {}
+        for kmer, children in self.graph.items():
+            if self._has_tie(children):
+                self.tie_sets[kmer] = set(self.ids[child] for child in children)
+        self._order_ties()
+
+    def _has_tie(self, children):
+        counts = sorted((self.counts[child] for child in children), reverse=True)
+        return any(a == b for a, b in zip(counts, counts[1:]))
+
+    def _order_ties(self):
+        for kmer, tie_set in self.tie_sets.items():
+            self.graph[kmer] = [self.kmers[idx] for idx in tie_set]
+
+    def get_longest_contig(self):
+        path = dbg_codon_simple.find_longest_path(self.graph, self.counts)
+        if not path:
+            return None
+        contig = dbg_codon_simple.concat_path(path)
+        for kmer in path:
+            self.tie_sets.pop(kmer, None)
+            for parent in self.parents[kmer]:
+                if parent in self.tie_sets:
+                    self.tie_sets[parent].discard(self.ids[kmer])
+        dbg_codon_simple.remove_path(self.graph, self.counts, self.parents, path)
+        for kmer, tie_set in list(self.tie_sets.items()):
+            if self._has_tie(self.graph[kmer]):
+                self.tie_sets[kmer] = tie_set - REBUILD
+            else:
+                del self.tie_sets[kmer]
+        self._order_ties()
+        return contig
+
+    def stats(self):
+        return {'nodes': len(self.graph), 'edges': sum(len(children) for children in self.graph.values())}
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Check that every backend assembles the same contigs, and compare their speed and memory"""
+from backends import BACKENDS, DIFFERENCES, get_backend
+from dbg import iter_contigs
+from fastx import read_dataset
+import argparse
+import multiprocessing
+import resource
+import sys
+import time
+
+
+def run_backend(name, path, k, n_contigs):
+    """Build and extract contigs with one backend, meant for a fresh process"""
+    sys.setrecursionlimit(1000000)
+    start = time.perf_counter()
+    dbg = get_backend(name)(k, read_dataset(path))
+    build = time.perf_counter() - start
+    stats = dbg.stats()
+    start = time.perf_counter()
+    contigs = list(iter_contigs(dbg, n_contigs))
+    extract = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return build, extract, peak, stats, contigs
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('data', nargs='*', default=['data/data1', 'data/data2', 'data/data3', 'data/data4'],
+                        help='dataset directories or zip archives')
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS),
+                        help='backends to run, the first is the reference')
+    parser.add_argument('-k', type=int, default=25)
+    parser.add_argument('--contigs', type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # a process per run, so every backend starts from the same memory
+    context = multiprocessing.get_context('fork')
+    mismatches = 0
+    print(f"{'Dataset':<16} {'Backend':<14} {'Nodes':>9} {'Build':>8} {'Extract':>8} {'Nodes/s':>9}"
+          f" {'Peak RSS':>9} {'Same':>6}")
+    for path in args.data:
+        reference = None
+        for name in args.backends:
+            with context.Pool(1) as pool:
+                build, extract, peak, stats, contigs = pool.apply(run_backend, (name, path, args.k, args.contigs))
+            if reference is None:
+                reference = contigs
+            same = sum(a == b for a, b in zip(contigs, reference))
+            note = ''
+            if same != len(reference) or len(contigs) != len(reference):
+                # a known difference is reported, not counted against the backend
+                known = DIFFERENCES.get(name)
+                if known:
+                    note = ' expected, ' + known
+                else:
+                    mismatches += 1
+            print(f"{path:<16} {name:<14} {stats['nodes']:>9} {build:>7.2f}s {extract:>7.2f}s"
+                  f" {stats['nodes'] / build:>9.0f} {peak:>7.0f}MB {same:>3}/{len(reference)}{note}")
+    if mismatches:
+        print(f"{mismatches} backend runs differ from the reference contigs")
+        sys.exit(1)
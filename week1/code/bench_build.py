@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""Compare the loop DBG build with the numpy build of its frozen form"""
+from dbg import DBG
+from dbg_numpy import build_vectorized
+from utils import read_data
+import sys
+import time
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} <data_directory>...")
+        sys.exit(1)
+
+    k = 25
+    print(f"{'Dataset':<20} {'Nodes':>10} {'Loop':>8} {'Freeze':>8} {'NumPy':>8} {'Speedup':>8} {'Parents':>8}")
+    for path in sys.argv[1:]:
+        data_list = list(read_data(path))
+        start = time.perf_counter()
+        dbg = DBG(k=k, data_list=data_list)
+        loop_time = time.perf_counter() - start
+        parents_bytes = dbg.parents_index_bytes()
+        start = time.perf_counter()
+        frozen = dbg.freeze()
+        freeze_time = time.perf_counter() - start
+        del dbg
+        start = time.perf_counter()
+        vectorized = build_vectorized(k, data_list)
+        numpy_time = time.perf_counter() - start
+        assert len(frozen) == len(vectorized) and len(frozen.targets) == len(vectorized.targets)
+        assert sorted(frozen.counts) == sorted(vectorized.counts)
+        print(f"{path:<20} {len(frozen):>10} {loop_time:>7.2f}s {freeze_time:>7.2f}s {numpy_time:>7.2f}s"
+              f" {(loop_time + freeze_time) / numpy_time:>7.2f}x {parents_bytes / 2 ** 20:>6.1f}MB")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Time each stage of the assembly and compare it with a stored baseline"""
+from dbg import DBG
+from utils import read_data
+import argparse
+import gc
+import json
+import multiprocessing
+import resource
+import statistics
+import sys
+import time
+
+STAGES = ('read_data', '_build', '_index_parents', '_get_longest_path', '_concat_path', '_delete_path')
+# stages faster than this are too noisy to flag
+MIN_SECONDS = 0.05
+
+
+def reset_peak_rss():
+    """Reset the process peak RSS to its current RSS, False where the kernel does not allow it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_kb():
+    """Peak RSS since the last reset_peak_rss, or of the whole process, in KB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class StageTimer:
+    """Wall time, CPU time and peak RSS of named stages, a stage may be entered many times.
+
+    The peak RSS of a stage is the highest RSS reached inside it over all
+    its runs. Where the peak cannot be reset, it is the most one run of
+    the stage raised the process peak, which reads 0 for a stage that
+    stays below an earlier stage's peak.
+    """
+
+    def __init__(self):
+        self.wall = dict.fromkeys(STAGES, 0.0)
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+        self.peak_rss_mb = dict.fromkeys(STAGES, 0.0)
+
+    def run(self, stage, f, *args):
+        reset = reset_peak_rss()
+        before = peak_rss_kb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = f(*args)
+        self.wall[stage] += time.perf_counter() - wall
+        self.cpu[stage] += time.process_time() - cpu
+        peak = peak_rss_kb() if reset else peak_rss_kb() - before
+        self.peak_rss_mb[stage] = max(self.peak_rss_mb[stage], peak / 1024)
+        return result
+
+
+def run_trial(path, k, n_contigs):
+    """One run of every stage on a dataset, meant for a fresh process"""
+    sys.setrecursionlimit(1000000)
+    timer = StageTimer()
+    data_list = list(timer.run('read_data', read_data, path))
+    dbg = DBG(k=k, data_list=[[]])
+    # as in DBG.__init__, the build runs without cyclic gc
+    gc.disable()
+    try:
+        timer.run('_build', dbg._build, data_list)
+        timer.run('_index_parents', dbg._index_parents)
+    finally:
+        gc.enable()
+    for _ in range(n_contigs):
+        nodes = timer.run('_get_longest_path', dbg._get_longest_path)
+        contig = timer.run('_concat_path', dbg._concat_path, nodes)
+        if contig is None:
+            break
+        timer.run('_delete_path', dbg._delete_path, nodes)
+    return timer.wall, timer.cpu, timer.peak_rss_mb
+
+
+def bench(paths, k, n_contigs, trials):
+    """Per dataset and stage, the wall, cpu and peak_rss_mb of every trial"""
+    results = {}
+    # a process per trial, so peak RSS and allocator state start fresh
+    context = multiprocessing.get_context('fork')
+    for path in paths:
+        stages = {stage: {'wall': [], 'cpu': [], 'peak_rss_mb': []} for stage in STAGES}
+        for _ in range(trials):
+            with context.Pool(1) as pool:
+                wall, cpu, peak = pool.apply(run_trial, (path, k, n_contigs))
+            for stage in STAGES:
+                stages[stage]['wall'].append(wall[stage])
+                stages[stage]['cpu'].append(cpu[stage])
+                stages[stage]['peak_rss_mb'].append(peak[stage])
+        results[path] = stages
+    return results
+
+
+def regressions(results, baseline, threshold):
+    """(dataset, stage, metric, baseline median, median) of the medians more than threshold above the baseline"""
+    found = []
+    for path, stages in results.items():
+        for stage, metrics in stages.items():
+            base_metrics = baseline.get(path, {}).get(stage)
+            if base_metrics is None:
+                continue
+            for metric in ('wall', 'peak_rss_mb'):
+                base, current = statistics.median(base_metrics[metric]), statistics.median(metrics[metric])
+                if metric == 'wall' and max(base, current) < MIN_SECONDS:
+                    continue
+                if current > base * (1 + threshold):
+                    found.append((path, stage, metric, base, current))
+    return found
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('data', nargs='*', default=['data/data1', 'data/data2', 'data/data3', 'data/data4'],
+                        help='dataset directories')
+    parser.add_argument('-k', type=int, default=25)
+    parser.add_argument('--contigs', type=int, default=20, help='contigs extracted per trial')
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--output', default='bench_stages.json', help='where to write the JSON results')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail when a median is more than this fraction above the baseline')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = bench(args.data, args.k, args.contigs, args.trials)
+    with open(args.output, 'w') as f:
+        json.dump({'k': args.k, 'contigs': args.contigs, 'trials': args.trials, 'results': results}, f, indent=1)
+
+    print(f"{'Dataset':<20} {'Stage':<18} {'Wall':>8} {'CPU':>8} {'Peak RSS':>9}")
+    for path, stages in results.items():
+        for stage, metrics in stages.items():
+            print(f"{path:<20} {stage:<18} {statistics.median(metrics['wall']):>7.2f}s"
+                  f" {statistics.median(metrics['cpu']):>7.2f}s {statistics.median(metrics['peak_rss_mb']):>7.0f}MB")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        found = regressions(results, baseline, args.threshold)
+        for path, stage, metric, base, current in found:
+            print(f"REGRESSION {path} {stage} {metric}: {base:.2f} -> {current:.2f}")
+        if found:
+            sys.exit(1)
+        print(f"no regression above {args.threshold:.0%} against {args.baseline}")
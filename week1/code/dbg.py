@@ -1,33 +1,97 @@
-import copy
+import gc
+import heapq
+import sys
+import time
 from matplotlib import pyplot as plt
+from kmer import encode_read, decode, last_base
+from sketch import CountMinSketch, SKETCH_BITS
 
 
-def reverse_complement(key):
-    complement = {'A': 'T', 'T': 'A', 'G': 'C', 'C': 'G'}
+# a depth heap entry is one int, -depth above HEAP_IDX_BITS bits of node id,
+# which orders like (-depth, idx) at a third of the memory of the tuple
+HEAP_IDX_BITS = 40
+HEAP_IDX_MASK = (1 << HEAP_IDX_BITS) - 1
 
-    key = list(key[::-1])
-    for i in range(len(key)):
-        key[i] = complement[key[i]]
-    return ''.join(key)
+
+def heap_entry(depth, idx):
+    return (-depth << HEAP_IDX_BITS) | idx
+
+
+# set difference with more ids than a node has children rebuilds the set by
+# inserting its ids in iteration order, which is how the original full delete
+# reordered every child set after each contig
+REBUILD = frozenset(range(-16, 0))
+
+
+def rebuild_children(children, times):
+    """children after times rebuilds, the iteration orders repeat within a few"""
+    seen = [tuple(children)]
+    while times:
+        children = children - REBUILD
+        times -= 1
+        order = tuple(children)
+        if order in seen:
+            period = len(seen) - seen.index(order)
+            for _ in range(times % period):
+                children = children - REBUILD
+            break
+        seen.append(order)
+    return children
+
+
+def iter_contigs(graph, max_contigs=None, min_length=None, max_seconds=None):
+    """Yield contigs of graph, longest first, as soon as each is found.
+
+    graph is anything with get_longest_contig(), a DBG, its frozen or
+    unitig forms or a backend. Stops when the graph is used up, after
+    max_contigs contigs, at the first contig shorter than min_length
+    (which is dropped), or before starting a contig once max_seconds
+    have passed.
+    """
+    deadline = None if max_seconds is None else time.perf_counter() + max_seconds
+    count = 0
+    while max_contigs is None or count < max_contigs:
+        if deadline is not None and time.perf_counter() >= deadline:
+            return
+        contig = graph.get_longest_contig()
+        if contig is None or (min_length is not None and len(contig) < min_length):
+            return
+        count += 1
+        yield contig
 
 
 class Node:
+    __slots__ = ('_children', '_parents', '_count', 'kmer', 'epoch', 'depth', 'max_depth_child', 'cyclic',
+                 'rebuilt')
+    # k-mers in the node, see dbg_unitig
+    length = 1
+
     def __init__(self, kmer):
         self._children = set()
+        # a k-mer has at most 4 in-neighbours, a list is smaller than a set
+        self._parents = []
         self._count = 0
         self.kmer = kmer
-        self.visited = False
+        # depth, max_depth_child and cyclic are valid while epoch matches DBG.epoch,
+        # cyclic when the DP found a cycle below the node
+        self.epoch = -1
         self.depth = 0
         self.max_depth_child = None
+        self.cyclic = False
+        # contigs deleted when the child set was last rebuilt, see DBG._sync_children
+        self.rebuilt = 0
 
     def add_child(self, kmer):
         self._children.add(kmer)
 
-    def increase(self):
-        self._count += 1
+    def add_parent(self, idx):
+        self._parents.append(idx)
+
+    def increase(self, count=1):
+        self._count += count
 
     def reset(self):
-        self.visited = False
+        self.epoch = -1
         self.depth = 0
         self.max_depth_child = None
 
@@ -37,111 +101,446 @@ class Node:
     def get_children(self):
         return list(self._children)
 
-    def remove_children(self, target):
-        self._children = self._children - target
+    def get_parents(self):
+        return list(self._parents)
+
+    def remove_child(self, idx):
+        self._children.discard(idx)
+
+    def remove_parent(self, idx):
+        self._parents.remove(idx)
+
+
+# long-read k-mers absent from the short reads need this many long-read occurrences
+LONG_MIN_COUNT = 3
 
 
 class DBG:
-    def __init__(self, k, data_list):
+    # pull several paths per longest path DP, see _get_longest_path
+    batch = False
+
+    def __init__(self, k, data_list, min_count=1, sketch_bits=SKETCH_BITS,
+                 max_memory=None, long_list=None, long_min_count=LONG_MIN_COUNT, target_coverage=None):
         self.k = k
         self.nodes = {}
         # private
         self.kmer2idx = {}
         self.kmer_count = 0
+        # longest path state kept between contigs
+        self.epoch = 0
+        self._stale = None
+        # highest depth a stale node had, none of them is deeper once recomputed
+        self._stale_bound = 0
+        self._depth_heap = []
+        self._deletions = 0
+        # nodes with children of equal count, whose order a rebuild can change
+        self._tied = set()
         # build
         self._check(data_list)
-        self._build(data_list)
+        if not 0 < min_count < 256:
+            raise ValueError('k-mers are counted up to 255, min_count must be in 1..255')
+        if max_memory is not None and min_count > 1:
+            raise ValueError('the external build takes no other build option')
+        if long_list is not None and not 0 < long_min_count < 256:
+            raise ValueError('long-read k-mers are counted up to 255, long_min_count must be in 1..255')
+        if target_coverage is not None and (min_count > 1 or max_memory is not None):
+            raise ValueError('normalization only feeds the serial build')
+        # counts of the reads kept by normalization, see dbg_normalize
+        self.normalizer = None
+        # the build allocates millions of nodes and sets that never form
+        # cycles, cyclic gc passes over them only cost time
+        gc.disable()
+        try:
+            if max_memory is not None:
+                # k-mers are counted in bucket files, max_memory bytes bound the counting
+                from dbg_external import build_external
+                build_external(self, data_list, max_memory)
+            elif min_count > 1:
+                self._build_solid(data_list, min_count, sketch_bits)
+            elif target_coverage is not None:
+                # duplicate reads are collapsed and reads of k-mers already
+                # covered target_coverage times dropped before the build
+                from dbg_normalize import Normalizer
+                self.normalizer = Normalizer(self.k, target_coverage, sketch_bits)
+                self._build_counted(self.normalizer.normalize(data_list))
+            else:
+                self._build(data_list)
+            if long_list is not None:
+                self._build_long(long_list, long_min_count, sketch_bits)
+            self._index_parents()
+        finally:
+            gc.enable()
 
     def _check(self, data_list):
-        # check data list
+        # check data list, streamed reads can only be checked as they are read
         assert len(data_list) > 0
-        assert self.k <= len(data_list[0][0])
+        if isinstance(data_list[0], list) and data_list[0]:
+            assert self.k <= len(data_list[0][0])
 
     def _build(self, data_list):
         for data in data_list:
             for original in data:
-                rc = reverse_complement(original)
+                # kmers are packed ints, rev[p] is the reverse complement of fwd[p]
+                fwd, rev = encode_read(original, self.k)
+                n = len(fwd)
                 for i in range(len(original) - self.k - 1):
-                    self._add_arc(original[i: i + self.k], original[i + 1: i + 1 + self.k])
-                    self._add_arc(rc[i: i + self.k], rc[i + 1: i + 1 + self.k])
+                    self._add_arc(fwd[i], fwd[i + 1])
+                    self._add_arc(rev[n - 1 - i], rev[n - 2 - i])
+
+    def _build_counted(self, records):
+        """_build from (read, count) records, a read counted c times adds its k-mers c times"""
+        for original, count in records:
+            fwd, rev = encode_read(original, self.k)
+            n = len(fwd)
+            for i in range(len(original) - self.k - 1):
+                self._add_arc(fwd[i], fwd[i + 1], count)
+                self._add_arc(rev[n - 1 - i], rev[n - 2 - i], count)
+
+    def _build_solid(self, data_list, min_count, sketch_bits):
+        """Two passes over the reads, only k-mers seen at least min_count times get a node.
+
+        The first pass counts every occurrence of a k-mer in the reads or
+        their reverse complements once in a count-min sketch, an arc is
+        only added when both its k-mers are solid. Solid nodes keep the
+        counts _build gives them. data_list must be iterable twice, like
+        lists or fastx.ReadStream.
+        """
+        sketch = CountMinSketch(sketch_bits)
+        for data in data_list:
+            for original in data:
+                fwd, rev = encode_read(original, self.k)
+                sketch.add_all(fwd + rev)
+
+        self._build_screened(data_list, lambda kmer: sketch.estimate(kmer) >= min_count)
+
+    def _build_long(self, long_list, long_min_count, sketch_bits=SKETCH_BITS):
+        """Add long reads to the graph of the short reads, keeping only confirmed k-mers.
+
+        A long-read k-mer is confirmed when the short reads already gave
+        it a node, or when it occurs long_min_count times in the long
+        reads, so the mostly erroneous long-read k-mers get no node. The
+        occurrences of k-mers the short reads lack go into a count-min
+        sketch, which can only overcount, so a few erroneous k-mers may
+        pass but none the exact count would keep is lost. The long reads
+        are read twice.
+        """
+        sketch = CountMinSketch(sketch_bits)
+        for data in long_list:
+            for original in data:
+                fwd, rev = encode_read(original, self.k)
+                sketch.add_all([kmer for kmer in fwd + rev if kmer not in self.kmer2idx])
+        # a confirmed k-mer is in kmer2idx once added, so the test holds as nodes are added
+        self._build_screened(long_list,
+                             lambda kmer: kmer in self.kmer2idx or sketch.estimate(kmer) >= long_min_count)
+
+    def _build_screened(self, data_list, solid):
+        """_build, except that only k-mers passing solid get a node and arcs need both ends solid"""
+        for data in data_list:
+            for original in data:
+                fwd, rev = encode_read(original, self.k)
+                solid_fwd = [solid(kmer) for kmer in fwd]
+                solid_rev = [solid(kmer) for kmer in rev]
+                n = len(fwd)
+                for i in range(len(original) - self.k - 1):
+                    self._add_solid_arc(fwd[i], solid_fwd[i], fwd[i + 1], solid_fwd[i + 1])
+                    self._add_solid_arc(rev[n - 1 - i], solid_rev[n - 1 - i], rev[n - 2 - i], solid_rev[n - 2 - i])
+
+    def _add_solid_arc(self, kmer1, solid1, kmer2, solid2):
+        # a solid k-mer keeps the count it would have in the full graph
+        if solid1:
+            idx1 = self._add_node(kmer1)
+        if solid2:
+            idx2 = self._add_node(kmer2)
+        if solid1 and solid2:
+            self.nodes[idx1].add_child(idx2)
+
+    def _index_parents(self):
+        # every builder only fills children, parents are indexed in one pass
+        for idx, node in self.nodes.items():
+            for child in node.get_children():
+                self.nodes[child].add_parent(idx)
+
+    def stats(self):
+        return {'nodes': len(self.nodes), 'edges': sum(len(node._children) for node in self.nodes.values())}
+
+    def parents_index_bytes(self):
+        """Memory held by the parents index, to weigh against the faster deletes"""
+        return sum(sys.getsizeof(node._parents) for node in self.nodes.values())
+
+    def freeze(self):
+        """Array form of the graph for contig extraction, see dbg_frozen"""
+        from dbg_frozen import FrozenDBG
+        return FrozenDBG(self)
+
+    def save(self, path):
+        """Write the graph to path in the binary format of dbg_frozen"""
+        self.freeze().save(path)
+
+    @staticmethod
+    def load(path):
+        """Graph written by save, memory-mapped and in its frozen array form"""
+        from dbg_frozen import FrozenDBG
+        return FrozenDBG.load(path)
+
+    def simplify(self, **thresholds):
+        """Remove tips and pop bubbles in place, see dbg_simplify for the thresholds"""
+        from dbg_simplify import simplify
+        return simplify(self, **thresholds)
+
+    def compact(self):
+        """Graph with non-branching paths collapsed into unitigs, see dbg_unitig.
+
+        The unitigs take over the child sets of this graph, which is not to
+        be used afterwards.
+        """
+        from dbg_unitig import UnitigDBG
+        return UnitigDBG(self)
 
     def show_count_distribution(self):
         count = [0] * 30
         for idx in self.nodes:
-            count[self.nodes[idx].get_count()] += 1
+            count[min(self.nodes[idx].get_count(), len(count) - 1)] += 1
         print(count[0:10])
         # plt.plot(count)
         # plt.show()
 
-    def _add_node(self, kmer):
+    def _add_node(self, kmer, count=1):
         if kmer not in self.kmer2idx:
             self.kmer2idx[kmer] = self.kmer_count
             self.nodes[self.kmer_count] = Node(kmer)
             self.kmer_count += 1
         idx = self.kmer2idx[kmer]
-        self.nodes[idx].increase()
+        self.nodes[idx].increase(count)
         return idx
 
-    def _add_arc(self, kmer1, kmer2):
-        idx1 = self._add_node(kmer1)
-        idx2 = self._add_node(kmer2)
+    def _add_arc(self, kmer1, kmer2, count=1):
+        idx1 = self._add_node(kmer1, count)
+        idx2 = self._add_node(kmer2, count)
         self.nodes[idx1].add_child(idx2)
 
     def _get_count(self, child):
         return self.nodes[child].get_count()
 
+    def _has_tie(self, children):
+        """Whether sorted children hold two of equal count, whose order the set decides"""
+        counts = [self._get_count(child) for child in children]
+        return any(a == b for a, b in zip(counts, counts[1:]))
+
+    def _sync_children(self, node):
+        """Give node's child set the order rebuilding it after every contig would have.
+
+        The original delete rebuilt every child set after each contig and a
+        rebuilt set of ints can iterate in another order, which decides ties
+        between children of equal count. Sets are rebuilt as they are read
+        instead, for every contig deleted since.
+        """
+        if node.rebuilt != self._deletions:
+            node._children = rebuild_children(node._children, self._deletions - node.rebuilt)
+            node.rebuilt = self._deletions
+
     def _get_sorted_children(self, idx):
+        self._sync_children(self.nodes[idx])
         children = self.nodes[idx].get_children()
         children.sort(key=self._get_count, reverse=True)
         return children
 
     def _get_depth(self, idx):
-        if not self.nodes[idx].visited:
-            self.nodes[idx].visited = True
+        node = self.nodes[idx]
+        if node.epoch != self.epoch:
+            # a node still on the recursion stack counts as depth 0
+            node.epoch, node.depth = self.epoch, 0
             children = self._get_sorted_children(idx)
-            max_depth, max_child = 0, None
+            max_depth, max_child, cyclic = 0, None, False
             for child in children:
                 depth = self._get_depth(child)
                 if depth > max_depth:
                     max_depth, max_child = depth, child
-            self.nodes[idx].depth, self.nodes[idx].max_depth_child = max_depth + 1, max_child
-        return self.nodes[idx].depth
+                # depth 0 is a child still on the stack, the arc closes a cycle
+                cyclic = cyclic or depth == 0 or self.nodes[child].cyclic
+            node.depth, node.max_depth_child, node.cyclic = max_depth + node.length, max_child, cyclic
+            if self._has_tie(children):
+                self._tied.add(idx)
+            heapq.heappush(self._depth_heap, heap_entry(node.depth, idx))
+        return node.depth
 
     def _reset(self):
-        for idx in self.nodes.keys():
-            self.nodes[idx].reset()
+        # a new epoch invalidates every cached depth at once
+        self.epoch += 1
+        self._stale = None
+        self._stale_bound = 0
+        self._depth_heap = []
+
+    def _invalidate_component(self, seeds):
+        """Mark stale every node connected to seeds, ignoring arc directions.
+
+        The DP never leaves a weakly connected component, so recomputing one
+        in id order gives the depths a full pass would. Depths on a cycle
+        may grow when recomputed, so they give batch mode no bound.
+        """
+        self._stale_bound = float('inf')
+        seen = set(seeds)
+        stack = list(seen)
+        while stack:
+            idx = stack.pop()
+            node = self.nodes[idx]
+            if node.epoch == self.epoch:
+                node.reset()
+                self._stale.append(idx)
+            for other in node.get_children() + node.get_parents():
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+
+    def _invalidate(self, path):
+        """Mark stale the nodes whose best path runs into a node of path.
+
+        A depth below a cycle depends on where the DP entered the cycle,
+        which a new pass over the remaining nodes may change, so if path or
+        a node marked stale reaches a cycle the whole component is.
+        """
+        if any(self.nodes[idx].cyclic for idx in path):
+            self._invalidate_component(path)
+            return
+        # the parents index gives the nodes that may have idx as best child
+        stack = list(path)
+        while stack:
+            idx = stack.pop()
+            for parent in self.nodes[idx].get_parents():
+                node = self.nodes[parent]
+                if node.max_depth_child == idx and node.epoch == self.epoch:
+                    if node.cyclic:
+                        self._invalidate_component(path)
+                        return
+                    self._stale_bound = max(self._stale_bound, node.depth)
+                    node.reset()
+                    self._stale.append(parent)
+                    stack.append(parent)
+
+    def _get_deepest(self):
+        """Deepest node with a valid depth, lowest id on ties, or None"""
+        # entries of recomputed or deleted nodes are dropped on the way
+        heap = self._depth_heap
+        while heap:
+            depth, idx = heap[0] >> HEAP_IDX_BITS, heap[0] & HEAP_IDX_MASK
+            node = self.nodes.get(idx)
+            if node is not None and node.epoch == self.epoch and node.depth == -depth:
+                return idx
+            heapq.heappop(heap)
+        return None
 
     def _get_longest_path(self):
-        max_depth, max_idx = 0, None
-        for idx in self.nodes.keys():
-            depth = self._get_depth(idx)
-            if depth > max_depth:
-                max_depth, max_idx = depth, idx
+        if self._stale is None:
+            stale = self.nodes.keys()
+        elif self.batch and self._batch_deepest() is not None:
+            # batch mode pulls paths out of the last DP while the deepest valid
+            # node is deeper than any stale node could become
+            stale = None
+        else:
+            # only stale nodes are recomputed, in id order as a full pass would visit them
+            stale = sorted(self._stale)
+        if stale is not None:
+            self._stale = []
+            self._stale_bound = 0
+            for idx in stale:
+                if idx in self.nodes:
+                    self._get_depth(idx)
 
+        max_idx = self._get_deepest()
         path = []
         while max_idx is not None:
             path.append(max_idx)
             max_idx = self.nodes[max_idx].max_depth_child
         return path
 
+    def _batch_deepest(self):
+        """Deepest valid node if no stale node can reach its depth, else None"""
+        max_idx = self._get_deepest()
+        if max_idx is None or self.nodes[max_idx].depth <= self._stale_bound:
+            return None
+        return max_idx
+
     def _delete_path(self, path):
+        self._invalidate(path)
+        # only the neighbours of the path are touched, through the parents index
+        path_set = set(path)
+        # the sets this contig's rebuild may reorder: those losing a child and
+        # those with children of equal count, with their order before it
+        self._tied.difference_update(path_set)
+        check = dict.fromkeys(self._tied)
+        for idx in path:
+            for parent in self.nodes[idx].get_parents():
+                if parent not in path_set:
+                    check[parent] = None
+        for idx in check:
+            check[idx] = [child for child in self._get_sorted_children(idx) if child not in path_set]
+
+        for idx in path:
+            node = self.nodes[idx]
+            for parent in node.get_parents():
+                if parent not in path_set:
+                    self.nodes[parent].remove_child(idx)
+            for child in node.get_children():
+                if child not in path_set:
+                    self.nodes[child].remove_parent(idx)
         for idx in path:
             del self.nodes[idx]
-        path_set = set(path)
-        for idx in self.nodes.keys():
-            self.nodes[idx].remove_children(path_set)
+        self._deletions += 1
+        for idx in check:
+            node = self.nodes[idx]
+            node._children = node._children - REBUILD
+            node.rebuilt = self._deletions
+        if self._stale is not None:
+            self._invalidate_reordered(check)
+
+    def _invalidate_reordered(self, before):
+        """Mark stale the nodes whose best child the new order of their children changes.
+
+        before maps nodes to their sorted children before the rebuild. A
+        reordered node on or above a cycle changes the order the DP walks
+        the cycle, so its whole component is marked stale instead.
+        """
+        reordered = []
+        for idx, children in before.items():
+            node = self.nodes[idx]
+            after = self._get_sorted_children(idx)
+            if not self._has_tie(after):
+                self._tied.discard(idx)
+            if after == children or node.epoch != self.epoch:
+                continue
+            if node.cyclic:
+                self._invalidate_component([idx])
+                continue
+            max_depth, max_child = 0, None
+            for child in after:
+                child_node = self.nodes[child]
+                if child_node.epoch != self.epoch:
+                    # a stale child may now tie with the best one
+                    max_child = -1
+                    break
+                if child_node.depth > max_depth:
+                    max_depth, max_child = child_node.depth, child
+            if max_child != node.max_depth_child:
+                reordered.append(idx)
+        for idx in reordered:
+            node = self.nodes[idx]
+            self._stale_bound = max(self._stale_bound, node.depth)
+            node.reset()
+            self._stale.append(idx)
+        self._invalidate(reordered)
 
     def _concat_path(self, path):
         if len(path) < 1:
             return None
-        concat = copy.copy(self.nodes[path[0]].kmer)
+        concat = [decode(self.nodes[path[0]].kmer, self.k)]
         for i in range(1, len(path)):
-            concat += self.nodes[path[i]].kmer[-1]
-        return concat
+            concat.append(last_base(self.nodes[path[i]].kmer))
+        return ''.join(concat)
+
+    def iter_contigs(self, max_contigs=None, min_length=None, max_seconds=None):
+        return iter_contigs(self, max_contigs, min_length, max_seconds)
 
     def get_longest_contig(self):
-        # reset params in nodes for getting longest path
-        self._reset()
+        # depths cached by the previous call stay valid except upstream of the deleted path
         path = self._get_longest_path()
         contig = self._concat_path(path)
         self._delete_path(path)
@@ -0,0 +1,308 @@
+import heapq
+from array import array
+from dbg import DBG, REBUILD, heap_entry, HEAP_IDX_BITS, HEAP_IDX_MASK
+from kmer import encode_read, decode, last_base, reverse_complement, BIT2BASE
+
+# flag of an entry recording an arc into the vertex rather than out of it
+INCOMING = 2
+
+
+class CanonicalNode:
+    """Node for a canonical k-mer, shared by both of its strands.
+
+    Vertex idx << 1 is the canonical k-mer and idx << 1 | 1 its reverse
+    complement. The node keeps one count for both and a single list of
+    oriented arcs: an entry is other_vertex << 2 | INCOMING | strand for
+    an arc into strand of this node, other_vertex << 2 | strand for an
+    arc out of it. Every arc is recorded at both ends, so the list is the
+    children and the parents index of both strands.
+    """
+    __slots__ = ('_edges', '_count', 'kmer')
+
+    def __init__(self, kmer):
+        self._edges = []
+        self._count = 0
+        self.kmer = kmer
+
+    def add_edge(self, entry):
+        # False if the arc was already there
+        if entry in self._edges:
+            return False
+        self._edges.append(entry)
+        return True
+
+    def increase(self, count=1):
+        self._count += count
+
+    def get_count(self):
+        return self._count
+
+    def get_children(self, strand):
+        return [entry >> 2 for entry in self._edges if entry & 3 == strand]
+
+    def get_parents(self, strand):
+        return [entry >> 2 for entry in self._edges if entry & 3 == INCOMING | strand]
+
+    def remove_edge(self, entry):
+        self._edges.remove(entry)
+
+
+class CanonicalDBG(DBG):
+    """DBG storing each k-mer once as min(kmer, revcomp(kmer)).
+
+    The arcs are those the double-strand build adds, each kept with the
+    strands of both its ends, and the longest path DP runs over the
+    oriented vertices with the incremental updates of DBG. Its depth,
+    best child and epoch are kept in arrays indexed by vertex, as are the
+    count of each strand and its rank, the order in which the build first
+    saw it. A vertex's rank is the id DBG gives its k-mer, so the DP
+    visits vertices and breaks depth ties by rank as DBG does by id. DBG
+    takes children of equal count in the order of its child set, so a
+    vertex with such children keeps the set of their ranks DBG would
+    have, rebuilt after every contig as DBG's is, and contigs are the
+    same as DBG's. A contig only removes the strands it runs through, so
+    the reverse complement of a contig can still come out, as in DBG. k
+    must be odd, so no k-mer is its own reverse complement.
+    """
+
+    def __init__(self, k, data_list):
+        if k % 2 == 0:
+            raise ValueError('a canonical graph needs an odd k, k=%d has k-mers equal to their reverse complement' % k)
+        # per vertex, filled by _add_node: count, rank and the vertex of each rank
+        self._counts = array('I')
+        self._ranks = array('q')
+        self._order = array('q')
+        super().__init__(k, data_list)
+        n = 2 * self.kmer_count
+        self._epochs = array('q', [-1]) * n
+        self._depths = array('q', [0]) * n
+        self._best = array('q', [-1]) * n
+        self._cyclic = bytearray(n)
+        self._deleted = bytearray(n)
+        # vertices with children of equal count, to the ranks of their children
+        self._tie_sets = {}
+
+    def _index_parents(self):
+        # _add_arc records every arc at both of its ends
+        pass
+
+    def _build(self, data_list):
+        for data in data_list:
+            for original in data:
+                fwd, rev = encode_read(original, self.k)
+                n = len(fwd)
+                for i in range(len(original) - self.k - 1):
+                    self._add_arc(fwd[i], rev[i], fwd[i + 1], rev[i + 1])
+                    self._add_arc(rev[n - 1 - i], fwd[n - 1 - i], rev[n - 2 - i], fwd[n - 2 - i])
+
+    def stats(self):
+        return {'nodes': len(self.nodes),
+                'edges': sum(len(node._edges) for node in self.nodes.values()) // 2}
+
+    def parents_index_bytes(self):
+        # parents share the arc lists with the children
+        return 0
+
+    def _add_node(self, kmer, rc):
+        strand = 0 if kmer < rc else 1
+        canonical = rc if strand else kmer
+        if canonical not in self.kmer2idx:
+            self.kmer2idx[canonical] = self.kmer_count
+            self.nodes[self.kmer_count] = CanonicalNode(canonical)
+            self.kmer_count += 1
+            self._counts.extend((0, 0))
+            self._ranks.extend((-1, -1))
+        idx = self.kmer2idx[canonical]
+        self.nodes[idx].increase()
+        vertex = idx << 1 | strand
+        if self._ranks[vertex] < 0:
+            self._ranks[vertex] = len(self._order)
+            self._order.append(vertex)
+        self._counts[vertex] += 1
+        return vertex
+
+    def _add_arc(self, kmer1, rc1, kmer2, rc2):
+        vertex1 = self._add_node(kmer1, rc1)
+        vertex2 = self._add_node(kmer2, rc2)
+        if self.nodes[vertex1 >> 1].add_edge(vertex2 << 2 | vertex1 & 1):
+            self.nodes[vertex2 >> 1].add_edge(vertex1 << 2 | INCOMING | vertex2 & 1)
+
+    def _get_count(self, child):
+        # the count of the strand, as DBG counts each oriented k-mer
+        return self._counts[child]
+
+    def _get_sorted_children(self, vertex):
+        node = self.nodes[vertex >> 1]
+        tie_set = self._tie_sets.get(vertex)
+        if tie_set is None:
+            children = node.get_children(vertex & 1)
+            children.sort(key=self._get_count, reverse=True)
+            # ties can only go away, the first DP finds them all before any delete
+            if self._deletions or not self._has_tie(children):
+                return children
+            # DBG's child set, its ids added in the order the arcs were
+            tie_set = self._tie_sets[vertex] = set(self._ranks[child] for child in node.get_children(vertex & 1))
+        children = [self._order[rank] for rank in tie_set]
+        children.sort(key=self._get_count, reverse=True)
+        return children
+
+    def _get_depth(self, vertex):
+        if self._epochs[vertex] != self.epoch:
+            # a vertex still on the recursion stack counts as depth 0
+            self._epochs[vertex], self._depths[vertex] = self.epoch, 0
+            children = self._get_sorted_children(vertex)
+            max_depth, max_child, cyclic = 0, -1, 0
+            for child in children:
+                depth = self._get_depth(child)
+                if depth > max_depth:
+                    max_depth, max_child = depth, child
+                # depth 0 is a child still on the stack, the arc closes a cycle
+                if depth == 0 or self._cyclic[child]:
+                    cyclic = 1
+            self._depths[vertex], self._best[vertex], self._cyclic[vertex] = max_depth + 1, max_child, cyclic
+            heapq.heappush(self._depth_heap, heap_entry(max_depth + 1, self._ranks[vertex]))
+        return self._depths[vertex]
+
+    def _invalidate_component(self, seeds):
+        """Mark stale every vertex connected to seeds, see DBG._invalidate_component"""
+        seen = set(seeds)
+        stack = list(seen)
+        while stack:
+            vertex = stack.pop()
+            if self._epochs[vertex] == self.epoch:
+                self._epochs[vertex] = -1
+                self._stale.append(vertex)
+            node = self.nodes[vertex >> 1]
+            for other in node.get_children(vertex & 1) + node.get_parents(vertex & 1):
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+
+    def _invalidate(self, path):
+        """Mark stale the vertices whose best path runs into a vertex of path.
+
+        As in DBG._invalidate, the whole component is marked stale instead
+        if path or a vertex to mark reaches a cycle.
+        """
+        if any(self._cyclic[vertex] for vertex in path):
+            self._invalidate_component(path)
+            return
+        stack = list(path)
+        while stack:
+            vertex = stack.pop()
+            for parent in self.nodes[vertex >> 1].get_parents(vertex & 1):
+                if self._best[parent] == vertex and self._epochs[parent] == self.epoch:
+                    if self._cyclic[parent]:
+                        self._invalidate_component(path)
+                        return
+                    self._epochs[parent] = -1
+                    self._stale.append(parent)
+                    stack.append(parent)
+
+    def _get_deepest(self):
+        """Deepest vertex with a valid depth, lowest rank on ties, or None"""
+        heap = self._depth_heap
+        while heap:
+            depth, vertex = heap[0] >> HEAP_IDX_BITS, self._order[heap[0] & HEAP_IDX_MASK]
+            if not self._deleted[vertex] and self._epochs[vertex] == self.epoch and self._depths[vertex] == -depth:
+                return vertex
+            heapq.heappop(heap)
+        return None
+
+    def _get_longest_path(self):
+        if self._stale is None:
+            # every vertex, in rank order
+            stale = self._order
+        elif self.batch and self._get_deepest() is not None:
+            stale = None
+        else:
+            stale = sorted(self._stale, key=self._ranks.__getitem__)
+        if stale is not None:
+            self._stale = []
+            for vertex in stale:
+                if not self._deleted[vertex]:
+                    self._get_depth(vertex)
+
+        max_vertex = self._get_deepest()
+        path = []
+        while max_vertex is not None:
+            path.append(max_vertex)
+            max_vertex = self._best[max_vertex]
+            if max_vertex == -1:
+                max_vertex = None
+        return path
+
+    def _delete_path(self, path):
+        self._invalidate(path)
+        # the child sets this contig's rebuild may reorder, with their order before it
+        path_set = set(path)
+        for vertex in path:
+            self._tie_sets.pop(vertex, None)
+        before = {vertex: [child for child in self._get_sorted_children(vertex) if child not in path_set]
+                  for vertex in self._tie_sets}
+        # an arc of a deleted strand goes from both of its ends, which may be the same node
+        for vertex in path:
+            node = self.nodes[vertex >> 1]
+            for entry in [entry for entry in node._edges if entry & 1 == vertex & 1]:
+                other = entry >> 2
+                mirror = (vertex << 2) | ((entry & INCOMING) ^ INCOMING) | (other & 1)
+                other_node = self.nodes[other >> 1]
+                if entry in node._edges:
+                    node.remove_edge(entry)
+                if mirror in other_node._edges:
+                    other_node.remove_edge(mirror)
+                if entry & INCOMING and other in self._tie_sets:
+                    self._tie_sets[other].discard(self._ranks[vertex])
+            self._deleted[vertex] = 1
+        for vertex in path:
+            if self._deleted[vertex ^ 1] and vertex >> 1 in self.nodes:
+                del self.nodes[vertex >> 1]
+        self._deletions += 1
+        for vertex, tie_set in self._tie_sets.items():
+            self._tie_sets[vertex] = tie_set - REBUILD
+        if self._stale is not None:
+            self._invalidate_reordered(before)
+
+    def _invalidate_reordered(self, before):
+        """Mark stale the vertices whose best child the rebuild changes, see DBG._invalidate_reordered"""
+        reordered = []
+        for vertex, children in before.items():
+            after = self._get_sorted_children(vertex)
+            if not self._has_tie(after):
+                del self._tie_sets[vertex]
+            if after == children or self._epochs[vertex] != self.epoch:
+                continue
+            if self._cyclic[vertex]:
+                self._invalidate_component([vertex])
+                continue
+            max_depth, max_child = 0, -1
+            for child in after:
+                if self._epochs[child] != self.epoch:
+                    # a stale child may now tie with the best one
+                    max_child = None
+                    break
+                if self._depths[child] > max_depth:
+                    max_depth, max_child = self._depths[child], child
+            if max_child != self._best[vertex]:
+                reordered.append(vertex)
+        for vertex in reordered:
+            self._epochs[vertex] = -1
+            self._stale.append(vertex)
+        self._invalidate(reordered)
+
+    def _oriented_kmer(self, vertex):
+        kmer = self.nodes[vertex >> 1].kmer
+        return reverse_complement(kmer, self.k) if vertex & 1 else kmer
+
+    def _last_base(self, vertex):
+        kmer = self.nodes[vertex >> 1].kmer
+        # the last base of the reverse complement is the complement of the first
+        return BIT2BASE[3 - (kmer >> 2 * (self.k - 1))] if vertex & 1 else last_base(kmer)
+
+    def _concat_path(self, path):
+        if len(path) < 1:
+            return None
+        concat = [decode(self._oriented_kmer(path[0]), self.k)]
+        for i in range(1, len(path)):
+            concat.append(self._last_base(path[i]))
+        return ''.join(concat)
@@ -1,19 +1,20 @@
 def reverse_complement(seq: str) -> str:
     """Calculate reverse complement of a DNA sequence"""
-    result = ""
-    for i in range(len(seq) - 1, -1, -1):
-        base = seq[i]
+    # bases go into a list joined once, += copied the whole prefix for every base
+    result = [''] * len(seq)
+    for i in range(len(seq)):
+        base = seq[len(seq) - 1 - i]
         if base == 'A':
-            result += 'T'
+            result[i] = 'T'
         elif base == 'T':
-            result += 'A'
+            result[i] = 'A'
         elif base == 'G':
-            result += 'C'
+            result[i] = 'C'
         elif base == 'C':
-            result += 'G'
+            result[i] = 'G'
         else:
-            result += 'N'
-    return result
+            result[i] = 'N'
+    return ''.join(result)
 
 def build_graph(sequences: list[list[str]], k: int) -> tuple[dict[str, list[str]], dict[str, int]]:
     """Build a de Bruijn graph from sequences"""
@@ -22,51 +23,33 @@ def build_graph(sequences: list[list[str]], k: int) -> tuple[dict[str, list[str]
     
     for seq_list in sequences:
         for seq in seq_list:
-            if len(seq) < k + 1:
+            if len(seq) < k + 2:
                 continue
                 
-            # Process forward sequence
-            for i in range(len(seq) - k):
-                kmer1 = seq[i:i+k]
-                kmer2 = seq[i+1:i+1+k]
-                
-                # Add nodes
-                if kmer1 not in graph:
-                    graph[kmer1] = []
-                    counts[kmer1] = 0
-                if kmer2 not in graph:
-                    graph[kmer2] = []
-                    counts[kmer2] = 0
-                    
-                # Add edge
-                if kmer2 not in graph[kmer1]:
-                    graph[kmer1].append(kmer2)
-                    
-                # Increment counts
-                counts[kmer1] += 1
-                counts[kmer2] += 1
-                
-            # Process reverse complement
+            # The arcs are those dbg.DBG adds, which stop one pair short of the
+            # end of the read, and the forward and reverse complement arcs
+            # alternate as in dbg.DBG, so k-mers are first seen in its order
             rc_seq = reverse_complement(seq)
-            for i in range(len(rc_seq) - k):
-                kmer1 = rc_seq[i:i+k]
-                kmer2 = rc_seq[i+1:i+1+k]
-                
-                # Add nodes
-                if kmer1 not in graph:
-                    graph[kmer1] = []
-                    counts[kmer1] = 0
-                if kmer2 not in graph:
-                    graph[kmer2] = []
-                    counts[kmer2] = 0
-                    
-                # Add edge
-                if kmer2 not in graph[kmer1]:
-                    graph[kmer1].append(kmer2)
-                    
-                # Increment counts
-                counts[kmer1] += 1
-                counts[kmer2] += 1
+            for i in range(len(seq) - k - 1):
+                for strand in (seq, rc_seq):
+                    kmer1 = strand[i:i+k]
+                    kmer2 = strand[i+1:i+1+k]
+
+                    # Add nodes
+                    if kmer1 not in graph:
+                        graph[kmer1] = []
+                        counts[kmer1] = 0
+                    if kmer2 not in graph:
+                        graph[kmer2] = []
+                        counts[kmer2] = 0
+
+                    # Add edge
+                    if kmer2 not in graph[kmer1]:
+                        graph[kmer1].append(kmer2)
+
+                    # Increment counts
+                    counts[kmer1] += 1
+                    counts[kmer2] += 1
                 
     return graph, counts
 
@@ -83,6 +66,8 @@ def find_longest_path(graph: dict[str, list[str]], counts: dict[str, int]) -> li
             return depths[node]
             
         visited[node] = True
+        # a node still on the DFS stack counts as depth 0, as in dbg.DBG
+        depths[node] = 0
         max_depth = 0
         max_child = None
         
@@ -106,8 +91,8 @@ def find_longest_path(graph: dict[str, list[str]], counts: dict[str, int]) -> li
     max_depth = 0
     max_node = None
     
+    # depths are memoized across starting nodes, a per-start reset made this quadratic
     for node in graph:
-        visited = {}  # Reset visited for each starting node
         depth = dfs(node)
         if depth > max_depth:
             max_depth = depth
@@ -136,32 +121,53 @@ def concat_path(path: list[str]) -> str:
         
     return result
 
-def remove_path(graph: dict[str, list[str]], counts: dict[str, int], path: list[str]) -> None:
-    """Remove a path from the graph"""
+def build_parents(graph: dict[str, list[str]]) -> dict[str, list[str]]:
+    """Index the in-neighbours of every k-mer"""
+    parents = {}
+    for node in graph:
+        parents[node] = []
+    for node in graph:
+        for child in graph[node]:
+            parents[child].append(node)
+    return parents
+
+def remove_path(graph: dict[str, list[str]], counts: dict[str, int], parents: dict[str, list[str]], path: list[str]) -> None:
+    """Remove a path from the graph, touching only the neighbours of its nodes"""
     path_set = set(path)
     
+    # Remove edges to deleted nodes
+    for node in path:
+        if node in parents:
+            for parent in parents[node]:
+                if parent not in path_set and parent in graph:
+                    graph[parent] = [child for child in graph[parent] if child != node]
+        if node in graph:
+            for child in graph[node]:
+                if child not in path_set and child in parents:
+                    parents[child] = [parent for parent in parents[child] if parent != node]
+    
     # Remove nodes in path
     for node in path:
         if node in graph:
             del graph[node]
         if node in counts:
             del counts[node]
-    
-    # Remove edges to deleted nodes
-    for node in list(graph.keys()):
-        graph[node] = [child for child in graph[node] if child not in path_set]
+        if node in parents:
+            del parents[node]
 
 def get_longest_contig(sequences: list[list[str]], k: int) -> str:
     """Get the longest contig from sequences using de Bruijn graph"""
     graph, counts = build_graph(sequences, k)
+    parents = build_parents(graph)
     path = find_longest_path(graph, counts)
     contig = concat_path(path)
-    remove_path(graph, counts, path)
+    remove_path(graph, counts, parents, path)
     return contig
 
 def assemble_contigs(sequences: list[list[str]], k: int, max_contigs: int = 20) -> list[str]:
     """Assemble contigs from sequences"""
     graph, counts = build_graph(sequences, k)
+    parents = build_parents(graph)
     contigs = []
     
     for i in range(max_contigs):
@@ -174,6 +180,6 @@ def assemble_contigs(sequences: list[list[str]], k: int, max_contigs: int = 20)
             
         contig = concat_path(path)
         contigs.append(contig)
-        remove_path(graph, counts, path)
+        remove_path(graph, counts, parents, path)
         
     return contigs
\ No newline at end of file
@@ -0,0 +1,270 @@
+import heapq
+import os
+import tempfile
+from array import array
+from collections import Counter, deque
+from multiprocessing import Pool
+
+from dbg import Node
+from dbg_parallel import read_stream
+from kmer import encode_read
+from sketch import MASK64, SEEDS
+
+# buckets when the input size is unknown
+N_BUCKETS = 64
+# open files and write buffers grow with the buckets
+MAX_BUCKETS = 4096
+MINIMIZER_LEN = 11
+# most records buffered per bucket before they are appended to its file
+FLUSH_RECORDS = 1 << 14
+# and the fewest, a file is opened for every flush
+MIN_FLUSH_RECORDS = 1 << 9
+# records read at a time from each bucket while merging
+MERGE_RECORDS = 1 << 14
+# memory a bucket takes while it is counted, per byte of its file
+BUCKET_EXPANSION = 8
+# bucket file bytes per input byte: a base starts about four k-mer records of
+# 16 bytes and two arc records of 24, a little more than the FASTA it is read from
+SPILL_PER_BYTE = 112
+
+
+def minimizer_buckets(seq, k, n_buckets, m=MINIMIZER_LEN):
+    """Bucket of every k-mer of seq, from the smallest hash of its canonical m-mers.
+
+    A k-mer and its reverse complement hold the same canonical m-mers, so
+    both strands of a k-mer always land in the same bucket. m is cut to k
+    for shorter k-mers.
+    """
+    m = min(m, k)
+    fwd, rev = encode_read(seq, m)
+    hashes = [(min(f, r) * SEEDS[0]) & MASK64 for f, r in zip(fwd, rev)]
+    window = k - m + 1
+    buckets, queue = [], deque()
+    # sliding window minimum, queue holds the positions of increasing hashes
+    for j, h in enumerate(hashes):
+        while queue and hashes[queue[-1]] >= h:
+            queue.pop()
+        queue.append(j)
+        if queue[0] <= j - window:
+            queue.popleft()
+        if j >= window - 1:
+            buckets.append((hashes[queue[0]] >> 32) % n_buckets)
+    return buckets
+
+
+def bucket_stream(buckets, m):
+    """Buckets lined up with dbg_parallel.read_stream"""
+    n = len(buckets)
+    stream = [0] * (4 * m)
+    stream[0::4] = buckets[:m]
+    stream[1::4] = buckets[1:m + 1]
+    stream[2::4] = buckets[n - 1:n - 1 - m:-1]
+    stream[3::4] = buckets[n - 2:n - 2 - m:-1]
+    return stream
+
+
+class BucketWriter:
+    """Appends fixed-width records of 64-bit words to one file per bucket"""
+
+    def __init__(self, directory, name, n_buckets, flush_records=FLUSH_RECORDS):
+        self.paths = [os.path.join(directory, '%s.%d' % (name, b)) for b in range(n_buckets)]
+        self.buffers = [array('Q') for _ in range(n_buckets)]
+        self.limit = flush_records
+
+    def add(self, bucket, record):
+        buffer = self.buffers[bucket]
+        buffer.extend(record)
+        if len(buffer) >= self.limit:
+            self.flush(bucket)
+
+    def flush(self, bucket):
+        with open(self.paths[bucket], 'ab') as f:
+            self.buffers[bucket].tofile(f)
+        del self.buffers[bucket][:]
+
+    def close(self):
+        for bucket in range(len(self.paths)):
+            self.flush(bucket)
+
+
+def split_into_buckets(data_list, k, directory, n_buckets, flush_records=FLUSH_RECORDS):
+    """First pass, every k-mer and arc occurrence written to its bucket with its rank.
+
+    Ranks count occurrences in the order DBG._build meets them, so the
+    smallest rank of a k-mer or arc is where the serial build adds it.
+    """
+    nodes = BucketWriter(directory, 'nodes', n_buckets, flush_records)
+    arcs = BucketWriter(directory, 'arcs', n_buckets, flush_records)
+    rank = arc_rank = 0
+    for data in data_list:
+        for original in data:
+            m = len(original) - k - 1
+            if m <= 0:
+                continue
+            stream = read_stream(original, k)
+            buckets = bucket_stream(minimizer_buckets(original, k, n_buckets), m)
+            for kmer, bucket in zip(stream, buckets):
+                nodes.add(bucket, (rank, kmer))
+                rank += 1
+            # an arc goes to the bucket of the k-mer it leaves
+            for kmer1, kmer2, bucket in zip(stream[0::2], stream[1::2], buckets[0::2]):
+                arcs.add(bucket, (arc_rank, kmer1, kmer2))
+                arc_rank += 1
+    nodes.close()
+    arcs.close()
+    return nodes.paths, arcs.paths
+
+
+def read_words(path):
+    words = array('Q')
+    with open(path, 'rb') as f:
+        words.frombytes(f.read())
+    return words
+
+
+def count_bucket(paths):
+    """Count and deduplicate one bucket, writing its distinct k-mers and arcs in order of first rank"""
+    nodes_path, arcs_path = paths
+    words = read_words(nodes_path)
+    ranks, kmers = words[0::2], words[1::2]
+    del words
+    # records were appended in rank order, so the Counter keys are in order of first rank
+    counts = Counter(kmers)
+    first = dict(zip(reversed(kmers), reversed(ranks)))
+    out = array('Q')
+    for kmer, count in counts.items():
+        out.extend((first[kmer], kmer, count))
+    del counts, first, ranks, kmers
+    with open(nodes_path + '.counted', 'wb') as f:
+        out.tofile(f)
+    os.remove(nodes_path)
+
+    words = read_words(arcs_path)
+    arc_first = {}
+    for rank, kmer1, kmer2 in zip(words[0::3], words[1::3], words[2::3]):
+        arc_first.setdefault((kmer1, kmer2), rank)
+    del words
+    out = array('Q')
+    for (kmer1, kmer2), rank in arc_first.items():
+        out.extend((rank, kmer1, kmer2))
+    with open(arcs_path + '.counted', 'wb') as f:
+        out.tofile(f)
+    os.remove(arcs_path)
+
+
+def iter_records(path, width):
+    """Records of a counted bucket file, MERGE_RECORDS at a time"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(8 * width * MERGE_RECORDS)
+            if not chunk:
+                return
+            words = array('Q')
+            words.frombytes(chunk)
+            yield from zip(*(words[i::width] for i in range(width)))
+
+
+def bucket_count(data_list, max_memory):
+    """Buckets for the first pass, enough that each is expected to count within max_memory bytes.
+
+    The input size is the nbytes of the read streams, compressed size for
+    gzipped or zipped inputs, so the buckets can still come out too large,
+    see split_bucket.
+    """
+    sizes = [getattr(data, 'nbytes', None) for data in data_list]
+    if None in sizes:
+        return N_BUCKETS
+    need = sum(sizes) * SPILL_PER_BYTE * BUCKET_EXPANSION
+    return max(1, min(MAX_BUCKETS, -(-need // max(1, max_memory))))
+
+
+def bucket_memory(paths):
+    """Estimated memory to count a bucket"""
+    nodes_path, arcs_path = paths
+    return (os.path.getsize(nodes_path) + os.path.getsize(arcs_path)) * BUCKET_EXPANSION
+
+
+def split_bucket(paths, parts):
+    """Split a bucket into parts buckets by k-mer, and by the k-mer an arc leaves.
+
+    Records keep their rank order within each part, and a k-mer or arc
+    lands in a single part, so the parts count as the bucket would.
+    """
+    nodes_path, arcs_path = paths
+    directory = os.path.dirname(nodes_path)
+    split = []
+    for path, width in ((nodes_path, 2), (arcs_path, 3)):
+        writer = BucketWriter(directory, os.path.basename(path), parts, MERGE_RECORDS)
+        for record in iter_records(path, width):
+            writer.add((((record[1] * SEEDS[1]) & MASK64) >> 32) % parts, record)
+        writer.close()
+        os.remove(path)
+        split.append(writer.paths)
+    return list(zip(*split))
+
+
+def fit_buckets(paths, max_memory):
+    """Buckets split until each is estimated to count within max_memory bytes.
+
+    A bucket that a split leaves as large, one k-mer repeated throughout
+    it, is counted as it is.
+    """
+    fitted = []
+    for bucket in paths:
+        memory = bucket_memory(bucket)
+        if memory <= max_memory:
+            fitted.append(bucket)
+            continue
+        parts = split_bucket(bucket, -(-memory // max(1, max_memory)) + 1)
+        if max(map(bucket_memory, parts)) < memory:
+            fitted.extend(fit_buckets(parts, max_memory))
+        else:
+            fitted.extend(parts)
+    return fitted
+
+
+def buckets_in_flight(paths, max_memory):
+    """Buckets counted at once so their estimated memory fits in max_memory bytes"""
+    largest = max(map(bucket_memory, paths))
+    fit = max_memory // max(1, largest)
+    return max(1, min(fit, os.cpu_count() or 1, len(paths)))
+
+
+def build_external(dbg, data_list, max_memory, n_buckets=None, tmp_dir=None):
+    """Fill dbg the same way DBG._build does, counting k-mers on disk.
+
+    K-mers and arcs are spilled to minimizer buckets, by default as many
+    as the input size needs for each to count within max_memory bytes,
+    with write buffers that fit in it too. Buckets still too large are
+    split, each bucket is counted and deduplicated on its own, as many at
+    a time as fit in max_memory bytes, and the counted buckets are merged
+    in order of first appearance, so node ids, counts and children match
+    the serial build. Only the finished graph is held in memory as a whole.
+    """
+    if dbg.k > 32:
+        raise ValueError('external build packs k-mers into 64-bit words, k must be <= 32')
+    if n_buckets is None:
+        n_buckets = bucket_count(data_list, max_memory)
+    # a node and an arc buffer per bucket, of 8-byte words, half the budget at most
+    # unless that leaves too few records per flush
+    flush_records = max(MIN_FLUSH_RECORDS, min(FLUSH_RECORDS, max_memory // (2 * 2 * 8 * n_buckets)))
+    with tempfile.TemporaryDirectory(prefix='dbg-buckets-', dir=tmp_dir) as directory:
+        node_paths, arc_paths = split_into_buckets(data_list, dbg.k, directory, n_buckets, flush_records)
+        paths = fit_buckets(list(zip(node_paths, arc_paths)), max_memory)
+        node_paths, arc_paths = [nodes for nodes, _ in paths], [arcs for _, arcs in paths]
+        workers = buckets_in_flight(paths, max_memory)
+        if workers > 1:
+            with Pool(workers) as pool:
+                pool.map(count_bucket, paths, chunksize=1)
+        else:
+            for bucket in paths:
+                count_bucket(bucket)
+
+        nodes, kmer2idx = dbg.nodes, dbg.kmer2idx
+        for _, kmer, count in heapq.merge(*(iter_records(path + '.counted', 3) for path in node_paths)):
+            idx = kmer2idx[kmer] = dbg.kmer_count
+            nodes[idx] = Node(kmer)
+            nodes[idx].increase(count)
+            dbg.kmer_count += 1
+        for _, kmer1, kmer2 in heapq.merge(*(iter_records(path + '.counted', 3) for path in arc_paths)):
+            nodes[kmer2idx[kmer1]].add_child(kmer2idx[kmer2])
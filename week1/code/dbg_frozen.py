@@ -0,0 +1,305 @@
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from dbg import iter_contigs, heap_entry, HEAP_IDX_BITS, HEAP_IDX_MASK
+from kmer import decode, from_words, last_base, n_words, to_words
+
+# graph file: header, then kmers, counts, offsets, targets, parent_offsets, sources
+# as native arrays, so a loaded graph is a set of views on the mapped file. A k-mer
+# is n_words(k) 64-bit words, version 1 only held k <= 32 in one word and reads the same
+GRAPH_MAGIC = b'DBGF'
+GRAPH_VERSION = 2
+GRAPH_HEADER = struct.Struct('<4sIIIQQ')  # magic, version, k, reserved, nodes, edges
+# checkpoint file: header, the deleted mask, valid, depth and best, then the contigs so far
+STATE_MAGIC = b'DBGC'
+STATE_VERSION = 2
+STATE_HEADER = struct.Struct('<4sIQQI')  # magic, version, nodes, edges, contigs
+# values of a valid byte, version 1 checkpoints lack CYCLIC
+VALID = 1
+CYCLIC = 2
+
+
+class FrozenDBG:
+    """Array form of a built DBG for contig extraction.
+
+    Node i's children, already sorted by count as _get_sorted_children
+    would, are targets[offsets[i]:offsets[i + 1]] and its parents are
+    sources[parent_offsets[i]:parent_offsets[i + 1]]. Counts, depths and
+    best children are typed arrays and deleted nodes are bits of a mask,
+    so edges are never rewritten. Node i is the i-th node of the DBG, its
+    k-mer the words kmers[i * words:(i + 1) * words], most significant first.
+    """
+
+    def __init__(self, dbg):
+        self.k = dbg.k
+        self.words = n_words(dbg.k)
+        ids = {idx: i for i, idx in enumerate(dbg.nodes)}
+        n = len(ids)
+        self.kmers = array('Q')
+        for node in dbg.nodes.values():
+            self.kmers.extend(to_words(node.kmer, self.k))
+        self.counts = array('I', (node.get_count() for node in dbg.nodes.values()))
+
+        self.offsets, self.targets = array('I', [0]), array('I')
+        in_degree = array('I', bytes(4 * n))
+        for idx in dbg.nodes:
+            children = [ids[child] for child in dbg._get_sorted_children(idx)]
+            self.targets.extend(children)
+            self.offsets.append(len(self.targets))
+            for child in children:
+                in_degree[child] += 1
+
+        # parents CSR, filled by counting sort on the children
+        self.parent_offsets = array('I', [0])
+        for i in range(n):
+            self.parent_offsets.append(self.parent_offsets[i] + in_degree[i])
+        self.sources = array('I', bytes(4 * len(self.targets)))
+        fill = array('I', self.parent_offsets[:n])
+        for i in range(n):
+            for pos in range(self.offsets[i], self.offsets[i + 1]):
+                child = self.targets[pos]
+                self.sources[fill[child]] = i
+                fill[child] += 1
+
+        self._init_state(n)
+
+    def _init_state(self, n):
+        self.deleted = bytearray((n + 7) // 8)
+        # longest path state, a node's depth is valid while its byte in valid is set,
+        # to CYCLIC when the DP found a cycle below the node
+        self.valid = bytearray(n)
+        self.depth = array('I', bytes(4 * n))
+        self.best = array('i', [-1]) * n
+        self._stale = None
+        self._depth_heap = []
+
+    def __len__(self):
+        return len(self.counts)
+
+    def freeze(self):
+        # already in array form
+        return self
+
+    def kmer(self, i):
+        """Packed k-mer of node i"""
+        w = self.words
+        return from_words(self.kmers[i * w:(i + 1) * w])
+
+    def _graph_arrays(self):
+        return (self.kmers, self.counts, self.offsets, self.targets, self.parent_offsets, self.sources)
+
+    def save(self, path):
+        """Write the graph arrays to path, see load"""
+        with open(path, 'wb') as f:
+            f.write(GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, self.k, 0, len(self), len(self.targets)))
+            for a in self._graph_arrays():
+                f.write(a)
+
+    @classmethod
+    def load(cls, path):
+        """Graph saved by save, its arrays are memory-mapped so nothing is read until used"""
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < GRAPH_HEADER.size:
+            raise ValueError('%s is not a graph file' % path)
+        magic, version, k, _, n, edges = GRAPH_HEADER.unpack_from(mm)
+        if magic != GRAPH_MAGIC:
+            raise ValueError('%s is not a graph file' % path)
+        if version not in (1, GRAPH_VERSION):
+            raise ValueError('%s has graph format version %d, expected %d' % (path, version, GRAPH_VERSION))
+        sizes = [('Q', n * n_words(k)), ('I', n), ('I', n + 1), ('I', edges), ('I', n + 1), ('I', edges)]
+        if len(mm) != GRAPH_HEADER.size + sum(array(code).itemsize * m for code, m in sizes):
+            raise ValueError('%s is truncated' % path)
+
+        views, pos, data = [], GRAPH_HEADER.size, memoryview(mm)
+        for code, m in sizes:
+            end = pos + array(code).itemsize * m
+            views.append(data[pos:end].cast(code))
+            pos = end
+        return cls.from_arrays(k, *views)
+
+    @classmethod
+    def from_arrays(cls, k, kmers, counts, offsets, targets, parent_offsets, sources):
+        """Graph over arrays laid out as the attributes of the same name, built without a DBG"""
+        graph = cls.__new__(cls)
+        graph.k = k
+        graph.words = n_words(k)
+        graph.kmers, graph.counts, graph.offsets, graph.targets = kmers, counts, offsets, targets
+        graph.parent_offsets, graph.sources = parent_offsets, sources
+        graph._init_state(len(counts))
+        return graph
+
+    def save_state(self, path, contigs):
+        """Checkpoint contig extraction, written to a temporary file first so path is always whole"""
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(STATE_HEADER.pack(STATE_MAGIC, STATE_VERSION, len(self), len(self.targets), len(contigs)))
+            for a in (self.deleted, self.valid, self.depth, self.best):
+                f.write(a)
+            for contig in contigs:
+                f.write(struct.pack('<Q', len(contig)))
+                f.write(contig.encode('ascii'))
+        os.replace(tmp, path)
+
+    def load_state(self, path):
+        """Resume from a checkpoint written by save_state, returns the contigs already extracted"""
+        with open(path, 'rb') as f:
+            magic, version, n, edges, n_contigs = STATE_HEADER.unpack(f.read(STATE_HEADER.size))
+            if magic != STATE_MAGIC or version != STATE_VERSION:
+                raise ValueError('%s is not a checkpoint of format version %d' % (path, STATE_VERSION))
+            if n != len(self) or edges != len(self.targets):
+                raise ValueError('%s was written for another graph' % path)
+            self.deleted[:] = f.read(len(self.deleted))
+            self.valid[:] = f.read(n)
+            self.depth = array('I', f.read(4 * n))
+            self.best = array('i', f.read(4 * n))
+            contigs = []
+            for _ in range(n_contigs):
+                length, = struct.unpack('<Q', f.read(8))
+                contigs.append(f.read(length).decode('ascii'))
+
+        # every node had a depth after the first pass, so the stale ones are those
+        # invalidated since and the heap holds the depths of all the others
+        live = [i for i in range(n) if not self.is_deleted(i)]
+        self._stale = [i for i in live if not self.valid[i]]
+        self._depth_heap = [heap_entry(self.depth[i], i) for i in live if self.valid[i]]
+        heapq.heapify(self._depth_heap)
+        return contigs
+
+    def nbytes(self):
+        """Memory held by the arrays and the depth heap"""
+        arrays = self._graph_arrays() + (self.depth, self.best)
+        heap = sys.getsizeof(self._depth_heap) + sum(sys.getsizeof(entry) for entry in self._depth_heap)
+        return sum(a.itemsize * len(a) for a in arrays) + len(self.deleted) + len(self.valid) + heap
+
+    def is_deleted(self, i):
+        return self.deleted[i >> 3] >> (i & 7) & 1
+
+    def _get_depth(self, root):
+        """DBG._get_depth without recursion, a node still being explored counts as depth 0"""
+        offsets, targets, valid, depth, best = self.offsets, self.targets, self.valid, self.depth, self.best
+        if valid[root]:
+            return depth[root]
+        valid[root], depth[root] = VALID, 0
+        # frames are [node, next child position, max depth, max child, cyclic]
+        stack = [[root, offsets[root], 0, -1, 0]]
+        while stack:
+            frame = stack[-1]
+            i, pos, max_depth, max_child, cyclic = frame
+            end = offsets[i + 1]
+            while pos < end:
+                child = targets[pos]
+                if self.is_deleted(child):
+                    pos += 1
+                    continue
+                if not valid[child]:
+                    break
+                if depth[child] > max_depth:
+                    max_depth, max_child = depth[child], child
+                # depth 0 is a child still being explored, the arc closes a cycle
+                if depth[child] == 0 or valid[child] == CYCLIC:
+                    cyclic = CYCLIC
+                pos += 1
+            if pos < end:
+                # explore the child, its depth is read when this frame resumes at pos
+                frame[1], frame[2], frame[3], frame[4] = pos, max_depth, max_child, cyclic
+                valid[child], depth[child] = VALID, 0
+                stack.append([child, offsets[child], 0, -1, 0])
+                continue
+            depth[i], best[i] = max_depth + 1, max_child
+            if cyclic:
+                valid[i] = CYCLIC
+            heapq.heappush(self._depth_heap, heap_entry(depth[i], i))
+            stack.pop()
+        return depth[root]
+
+    def _invalidate_component(self, seeds):
+        """Clear the depth of every node connected to seeds, ignoring arc directions"""
+        seen = set(seeds)
+        stack = list(seen)
+        while stack:
+            i = stack.pop()
+            if self.valid[i] and not self.is_deleted(i):
+                self.valid[i] = 0
+                self._stale.append(i)
+            for pos in range(self.offsets[i], self.offsets[i + 1]):
+                if self.targets[pos] not in seen:
+                    seen.add(self.targets[pos])
+                    stack.append(self.targets[pos])
+            for pos in range(self.parent_offsets[i], self.parent_offsets[i + 1]):
+                if self.sources[pos] not in seen:
+                    seen.add(self.sources[pos])
+                    stack.append(self.sources[pos])
+
+    def _invalidate(self, path):
+        """Clear the depth of the nodes whose best path runs into a node of path.
+
+        As in DBG._invalidate, the whole component is cleared instead if path
+        or a node to clear reaches a cycle.
+        """
+        if any(self.valid[i] == CYCLIC for i in path):
+            self._invalidate_component(path)
+            return
+        stack = list(path)
+        while stack:
+            i = stack.pop()
+            for pos in range(self.parent_offsets[i], self.parent_offsets[i + 1]):
+                parent = self.sources[pos]
+                if self.best[parent] == i and self.valid[parent] and not self.is_deleted(parent):
+                    if self.valid[parent] == CYCLIC:
+                        self._invalidate_component(path)
+                        return
+                    self.valid[parent] = 0
+                    self._stale.append(parent)
+                    stack.append(parent)
+
+    def _get_longest_path(self):
+        if self._stale is None:
+            stale = range(len(self))
+        else:
+            stale = sorted(self._stale)
+        for i in stale:
+            if not self.is_deleted(i):
+                self._get_depth(i)
+        self._stale = []
+
+        heap, max_i = self._depth_heap, -1
+        while heap:
+            depth, i = heap[0] >> HEAP_IDX_BITS, heap[0] & HEAP_IDX_MASK
+            if self.valid[i] and not self.is_deleted(i) and self.depth[i] == -depth:
+                max_i = i
+                break
+            heapq.heappop(heap)
+
+        path = []
+        while max_i != -1:
+            path.append(max_i)
+            max_i = self.best[max_i]
+        return path
+
+    def _delete_path(self, path):
+        self._invalidate(path)
+        for i in path:
+            self.deleted[i >> 3] |= 1 << (i & 7)
+
+    def _concat_path(self, path):
+        if len(path) < 1:
+            return None
+        concat = [decode(self.kmer(path[0]), self.k)]
+        for i in range(1, len(path)):
+            # the last word holds the last base
+            concat.append(last_base(self.kmers[(path[i] + 1) * self.words - 1]))
+        return ''.join(concat)
+
+    def iter_contigs(self, max_contigs=None, min_length=None, max_seconds=None):
+        return iter_contigs(self, max_contigs, min_length, max_seconds)
+
+    def get_longest_contig(self):
+        path = self._get_longest_path()
+        contig = self._concat_path(path)
+        self._delete_path(path)
+        return contig
@@ -0,0 +1,68 @@
+from dbg import DBG
+
+
+class CountedInput:
+    """Reads of one input, counting reads and bases as they are iterated"""
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+        self.bases = 0
+
+    def __iter__(self):
+        for read in self.data:
+            self.reads += 1
+            self.bases += len(read)
+            yield read
+
+    def summary(self):
+        # bytes is the size of the input on disk, compressed size for zip members
+        return {'name': getattr(self.data, 'name', None), 'bytes': getattr(self.data, 'nbytes', None),
+                'reads': self.reads, 'bases': self.bases}
+
+
+class InstrumentedDBG(DBG):
+    """DBG reporting its hot paths to a metrics.Metrics.
+
+    Only this subclass pays for the counting, a plain DBG runs unchanged.
+    Build metrics are emitted once the graph is built, the ones of
+    contig extraction whenever the caller emits.
+    """
+
+    def __init__(self, k, data_list, metrics):
+        self.metrics = metrics
+        # recursion level of _get_depth
+        self._level = 0
+        inputs = [CountedInput(data) for data in data_list]
+        with metrics.timer('build_seconds'):
+            super().__init__(k, inputs)
+        metrics.count('nodes', len(self.nodes))
+        metrics.count('edges', sum(len(node._children) for node in self.nodes.values()))
+        metrics.emit(stage='build', k=k, inputs=[data.summary() for data in inputs])
+
+    def _add_node(self, kmer, count=1):
+        if kmer in self.kmer2idx:
+            self.metrics.count('add_node_hits')
+        else:
+            self.metrics.count('add_node_misses')
+        return super()._add_node(kmer, count)
+
+    def _get_depth(self, idx):
+        self.metrics.count('get_depth_calls')
+        self._level += 1
+        self.metrics.maximum('max_recursion_depth', self._level)
+        try:
+            return super()._get_depth(idx)
+        finally:
+            self._level -= 1
+
+    def _delete_path(self, path):
+        self.metrics.count('deleted_nodes', len(path))
+        # parent and child entries followed to unlink the path
+        self.metrics.count('touched_neighbours', sum(
+            len(self.nodes[idx]._parents) + len(self.nodes[idx]._children) for idx in path))
+        super()._delete_path(path)
+
+    def get_longest_contig(self):
+        with self.metrics.timer('contig_seconds'):
+            return super().get_longest_contig()
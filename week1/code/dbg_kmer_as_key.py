@@ -1,25 +1,26 @@
 import copy
 
+from kmer import reverse_complement_seq
 
-def reverse_complement(key):
-    complement = {'A': 'T', 'T': 'A', 'G': 'C', 'C': 'G'}
 
-    key = list(key[::-1])
-    for i in range(len(key)):
-        key[i] = complement[key[i]]
-    return ''.join(key)
+def reverse_complement(key):
+    # one translate over the whole read instead of a dict lookup per base
+    return reverse_complement_seq(key)
 
 
 class Node:
-    def __init__(self):
+    def __init__(self, idx):
+        # children are kept as first-seen ids, as in dbg.DBG, so the set
+        # iterates them in the same order and ties break alike
+        self.idx = idx
         self._children = set()
         self._count = 0
         self.visited = False
         self.depth = 0
         self.max_depth_child = None
 
-    def add_child(self, kmer):
-        self._children.add(kmer)
+    def add_child(self, idx):
+        self._children.add(idx)
 
     def increase(self):
         self._count += 1
@@ -36,6 +37,7 @@ class Node:
         return list(self._children)
 
     def remove_children(self, target):
+        # a rebuilt set, as dbg.DBG replays, so both iterate in the same order
         self._children = self._children - target
 
 
@@ -43,6 +45,8 @@ class DBG:
     def __init__(self, k, data_list):
         self.k = k
         self.nodes = {}
+        # k-mer of every first-seen id
+        self.kmers = []
         # build
         self._check(data_list)
         self._build(data_list)
@@ -62,19 +66,20 @@ class DBG:
 
     def _add_node(self, kmer):
         if kmer not in self.nodes:
-            self.nodes[kmer] = Node()
+            self.nodes[kmer] = Node(len(self.kmers))
+            self.kmers.append(kmer)
         self.nodes[kmer].increase()
 
     def _add_arc(self, kmer1, kmer2):
         self._add_node(kmer1)
         self._add_node(kmer2)
-        self.nodes[kmer1].add_child(kmer2)
+        self.nodes[kmer1].add_child(self.nodes[kmer2].idx)
 
     def _get_count(self, child):
         return self.nodes[child].get_count()
 
     def _get_sorted_children(self, kmer):
-        children = self.nodes[kmer].get_children()
+        children = [self.kmers[idx] for idx in self.nodes[kmer].get_children()]
         children.sort(key=self._get_count, reverse=True)
         return children
 
@@ -108,9 +113,9 @@ class DBG:
         return path
 
     def _delete_path(self, path):
+        path_set = {self.nodes[kmer].idx for kmer in path}
         for kmer in path:
             del self.nodes[kmer]
-        path_set = set(path)
         for kmer in self.nodes.keys():
             self.nodes[kmer].remove_children(path_set)
 
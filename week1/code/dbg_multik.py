@@ -0,0 +1,47 @@
+import gc
+import multiprocessing
+
+from dbg import DBG
+from dbg_parallel import iter_slices
+
+# graphs being assembled, forked workers inherit them instead of unpickling copies
+_graphs = []
+
+
+def build_multi_k(ks, data_list):
+    """One graph per k from a single pass over the reads.
+
+    Each slice of reads is encoded for every k while it is in memory, so
+    the inputs are read and decompressed once however many k are swept.
+    Every graph is the one DBG(k, data_list) would build.
+    """
+    graphs = [DBG(k, [[]]) for k in ks]
+    gc.disable()
+    try:
+        for reads in iter_slices(data_list):
+            for dbg in graphs:
+                dbg._build([reads])
+        for dbg in graphs:
+            dbg._index_parents()
+    finally:
+        gc.enable()
+    return graphs
+
+
+def _extract(args):
+    i, n_contigs = args
+    return list(_graphs[i].iter_contigs(n_contigs))
+
+
+def assemble_multi_k(graphs, n_contigs, workers=1):
+    """Contigs of every graph, extracted in up to workers forked processes"""
+    workers = min(workers, len(graphs))
+    if workers <= 1:
+        return [list(dbg.iter_contigs(n_contigs)) for dbg in graphs]
+    _graphs[:] = graphs
+    try:
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            return pool.map(_extract, [(i, n_contigs) for i in range(len(graphs))], chunksize=1)
+    finally:
+        _graphs.clear()
+
@@ -0,0 +1,85 @@
+import time
+from collections import Counter
+from itertools import islice
+
+from kmer import encode_read
+from sketch import CountMinSketch, MASK64, SEEDS, SKETCH_BITS
+
+TARGET_COVERAGE = 20
+# only k-mers whose hash falls in this fraction of the range are tracked, the
+# same k-mers in every read, so the median of a read's sampled k-mers stands
+# for the median of all of them at a fraction of the sketch updates
+KMER_FRACTION = 1 / 4
+# reads collapsed at a time, duplicates further apart stay separate records
+WINDOW = 1 << 16
+# sampling hash, a seed no sketch row uses at the default depth: sampling by a
+# row's own hash would put every sampled k-mer in the first counters of that row
+SAMPLE_SEED = SEEDS[5]
+
+
+class Normalizer:
+    """Streaming digital normalization of reads into (read, count) records.
+
+    Exact duplicates within a window of WINDOW reads are collapsed into
+    one record counted as many times, in order of first appearance. A
+    record is dropped when the median count-min estimate of its sampled
+    canonical k-mers already reaches target_coverage, otherwise they are
+    added to the sketch, count times. Totals and the time spent filtering are
+    kept for report.
+    """
+
+    def __init__(self, k, target_coverage=TARGET_COVERAGE, sketch_bits=SKETCH_BITS, kmer_fraction=KMER_FRACTION):
+        if not 0 < target_coverage < 256:
+            raise ValueError('the sketch counts up to 255, target_coverage must be in 1..255')
+        self.k = k
+        self.target = target_coverage
+        self.sketch = CountMinSketch(sketch_bits)
+        self.limit = int(kmer_fraction * MASK64)
+        self.reads = self.bases = self.records = self.kept_reads = self.kept_records = 0
+        self.seconds = 0.0
+
+    def keep(self, read, count):
+        fwd, rev = encode_read(read, self.k)
+        seed, limit = SAMPLE_SEED, self.limit
+        kmers = [kmer for kmer in map(min, fwd, rev) if (kmer * seed) & MASK64 < limit]
+        # a read too short to hold a sampled k-mer is passed on as is
+        if not kmers:
+            return True
+        estimates = sorted(self.sketch.estimate_all(kmers))
+        if estimates[len(estimates) // 2] >= self.target:
+            return False
+        self.sketch.add_all(kmers, count)
+        return True
+
+    def normalize(self, data_list):
+        """(read, count) records of the reads kept, a window of reads at a time"""
+        for data in data_list:
+            reads = iter(data)
+            while True:
+                start = time.perf_counter()
+                window = Counter(islice(reads, WINDOW))
+                if not window:
+                    break
+                kept = []
+                for read, count in window.items():
+                    self.reads += count
+                    self.bases += count * len(read)
+                    if self.keep(read, count):
+                        kept.append((read, count))
+                        self.kept_reads += count
+                self.records += len(window)
+                self.kept_records += len(kept)
+                self.seconds += time.perf_counter() - start
+                yield from kept
+
+    def report(self):
+        return {
+            'reads': self.reads,
+            'records': self.records,
+            'kept_reads': self.kept_reads,
+            'kept_records': self.kept_records,
+            'kept_fraction': self.kept_reads / self.reads if self.reads else 0,
+            'seconds': round(self.seconds, 2),
+            'reads_per_second': round(self.reads / self.seconds) if self.seconds else 0,
+            'mbases_per_second': round(self.bases / self.seconds / 1e6, 2) if self.seconds else 0,
+        }
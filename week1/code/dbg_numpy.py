@@ -0,0 +1,130 @@
+from array import array
+
+import numpy as np
+
+BLOCK_BASES = 1 << 16
+
+BASE_LUT = np.full(256, 255, dtype=np.uint8)
+for _code, _base in enumerate(b'ACGT'):
+    BASE_LUT[_base] = _code
+
+
+def iter_blocks(data_list, block_bases=BLOCK_BASES):
+    """Group consecutive reads of equal length into blocks of at most block_bases bases"""
+    block = []
+    for data in data_list:
+        for read in data:
+            if block and (len(read) != len(block[0]) or (len(block) + 1) * len(read) > block_bases):
+                yield block
+                block = []
+            block.append(read)
+    if block:
+        yield block
+
+
+def encode_block(reads, k):
+    """Pack every k-mer of a block of equal-length reads into uint64.
+
+    Returns (fwd, rev) of shape (len(reads), L - k + 1) where rev holds the
+    reverse complement of the k-mer at the same position.
+    """
+    length = len(reads[0])
+    raw = np.frombuffer(''.join(reads).encode('ascii'), dtype=np.uint8)
+    bases = BASE_LUT[raw].reshape(len(reads), length)
+    if (bases == 255).any():
+        raise ValueError('reads may only contain A, C, G and T')
+    bases = bases.astype(np.uint64)
+    comp = np.uint64(3) - bases
+    n = length - k + 1
+    fwd = np.zeros((len(reads), n), dtype=np.uint64)
+    rev = np.zeros((len(reads), n), dtype=np.uint64)
+    for j in range(k):
+        fwd = (fwd << np.uint64(2)) | bases[:, j:j + n]
+        rev |= comp[:, j:j + n] << np.uint64(2 * j)
+    return fwd, rev
+
+
+def arc_stream(fwd, rev, m):
+    """K-mers in the order DBG._build passes them to _add_node, arcs are consecutive pairs"""
+    n = fwd.shape[1]
+    i = np.arange(m)
+    stream = np.stack([fwd[:, i], fwd[:, i + 1], rev[:, n - 1 - i], rev[:, n - 2 - i]], axis=2)
+    return stream.reshape(-1)
+
+
+def to_array(code, values):
+    """Python array of typecode code holding a numpy array's values"""
+    out = array(code)
+    out.frombytes(np.ascontiguousarray(values, dtype=np.dtype(code)).tobytes())
+    return out
+
+
+def csr(keys, values, n):
+    """Offsets and values of a CSR over n rows, keys sorted and values in the same order"""
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n), out=offsets[1:])
+    return to_array('I', offsets), to_array('I', values)
+
+
+def build_vectorized(k, data_list, block_bases=BLOCK_BASES):
+    """FrozenDBG of the graph DBG(k, data_list) builds, built with numpy.
+
+    Every block of reads is reduced to its distinct k-mers and arcs with
+    counts and stream position of first appearance, the blocks are merged
+    the same way, and the CSR arrays are filled by sorts, bincount and
+    cumsum, so no Python object is made per k-mer. Node ids are in order of
+    first appearance as in DBG, counts, children and parents are DBG's.
+    Children of equal count are in order of first appearance of the arc
+    rather than DBG's, so contigs can differ from DBG's where paths tie.
+    """
+    from dbg_frozen import FrozenDBG
+
+    if k > 32:
+        raise ValueError('vectorized build packs k-mers into uint64, k must be <= 32')
+    kmer_parts, count_parts, first_parts, src_parts, dst_parts, arc_first_parts = [], [], [], [], [], []
+    offset = 0
+    for reads in iter_blocks(data_list, block_bases):
+        m = len(reads[0]) - k - 1
+        if m <= 0:
+            continue
+        stream = arc_stream(*encode_block(reads, k), m)
+        kmers, first, inverse, counts = np.unique(stream, return_index=True, return_inverse=True,
+                                                  return_counts=True)
+        kmer_parts.append(kmers)
+        count_parts.append(counts)
+        first_parts.append(first + offset)
+        # arcs as pairs of block-local k-mer ranks
+        inverse = inverse.reshape(-1).astype(np.uint64)
+        arcs, arc_first = np.unique((inverse[0::2] << np.uint64(32)) | inverse[1::2], return_index=True)
+        src_parts.append(kmers[arcs >> np.uint64(32)])
+        dst_parts.append(kmers[arcs & np.uint64(0xffffffff)])
+        arc_first_parts.append(2 * arc_first + offset)
+        offset += len(stream)
+    if not kmer_parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return FrozenDBG.from_arrays(k, array('Q'), array('I'), *csr(empty, empty, 0), *csr(empty, empty, 0))
+
+    # blocks are in stream order, so the first of equal values in the
+    # concatenation holds the earliest appearance
+    kmers, index, inverse = np.unique(np.concatenate(kmer_parts), return_index=True, return_inverse=True)
+    first = np.concatenate(first_parts)[index]
+    counts = np.bincount(inverse.reshape(-1), weights=np.concatenate(count_parts)).astype(np.int64)
+    order = np.argsort(first, kind='stable')
+    ids = np.empty(len(order), dtype=np.int64)
+    ids[order] = np.arange(len(order))
+    n = len(order)
+
+    src = ids[np.searchsorted(kmers, np.concatenate(src_parts))].astype(np.uint64)
+    dst = ids[np.searchsorted(kmers, np.concatenate(dst_parts))].astype(np.uint64)
+    arcs, index = np.unique((src << np.uint64(32)) | dst, return_index=True)
+    arc_first = np.concatenate(arc_first_parts)[index]
+    src = (arcs >> np.uint64(32)).astype(np.int64)
+    dst = (arcs & np.uint64(0xffffffff)).astype(np.int64)
+    counts = counts[order]
+
+    # children by count, ties by first appearance of the arc; parents by id
+    children = np.lexsort((arc_first, -counts[dst], src))
+    parents = np.lexsort((src, dst))
+    return FrozenDBG.from_arrays(k, to_array('Q', kmers[order]), to_array('I', counts),
+                                 *csr(src[children], dst[children], n),
+                                 *csr(dst[parents], src[parents], n))
@@ -0,0 +1,238 @@
+import os
+import tempfile
+from array import array
+from collections import Counter
+from multiprocessing import Pool
+
+from kmer import encode_read
+
+# first appearance of a k-mer or arc, as slice << RANK_BITS | rank within the slice
+RANK_BITS = 40
+SLICE_SIZE = 16384
+
+
+def shard_of(kmer, n_shards):
+    """Routing function, the shard that owns a k-mer, its node id range and the arcs leaving it"""
+    return kmer % n_shards
+
+
+def read_stream(original, k):
+    """K-mers of a read in the order DBG._build passes them to _add_node, arcs are consecutive pairs"""
+    fwd, rev = encode_read(original, k)
+    n = len(fwd)
+    m = len(original) - k - 1
+    stream = [0] * (4 * m)
+    stream[0::4] = fwd[:m]
+    stream[1::4] = fwd[1:m + 1]
+    stream[2::4] = rev[n - 1:n - 1 - m:-1]
+    stream[3::4] = rev[n - 2:n - 2 - m:-1]
+    return stream
+
+
+def save_arrays(path, arrays):
+    """Write arrays to path after their lengths, see load_arrays"""
+    with open(path, 'wb') as f:
+        array('Q', [len(a) for a in arrays]).tofile(f)
+        for a in arrays:
+            a.tofile(f)
+
+
+def load_arrays(path, codes):
+    """Arrays written by save_arrays, one per typecode"""
+    with open(path, 'rb') as f:
+        lengths = array('Q')
+        lengths.fromfile(f, len(codes))
+        arrays = []
+        for code, n in zip(codes, lengths):
+            a = array(code)
+            a.fromfile(f, n)
+            arrays.append(a)
+    return arrays
+
+
+def shard_path(directory, name, a, b):
+    return os.path.join(directory, '%s.%d.%d' % (name, a, b))
+
+
+def count_slice(args):
+    """Count the k-mers and arcs of a slice of reads into one file per shard.
+
+    The k-mers go to the shard that owns them with their first rank and
+    count, the distinct arcs to the shard owning the k-mer they enter,
+    which resolves it to a node id.
+    """
+    k, part, reads, n_shards, directory = args
+    counts, arcs = Counter(), {}
+    for original in reads:
+        if len(original) - k - 1 <= 0:
+            continue
+        stream = read_stream(original, k)
+        # Counter and dict keep keys in order of first appearance
+        counts.update(stream)
+        arcs.update(dict.fromkeys(zip(stream[0::2], stream[1::2])))
+
+    base = part << RANK_BITS
+    kmer_shards = [(array('Q'), array('Q'), array('Q')) for _ in range(n_shards)]
+    for rank, (kmer, count) in enumerate(counts.items()):
+        firsts, kmers, shard_counts = kmer_shards[shard_of(kmer, n_shards)]
+        firsts.append(base + rank)
+        kmers.append(kmer)
+        shard_counts.append(count)
+    arc_shards = [(array('Q'), array('Q'), array('Q')) for _ in range(n_shards)]
+    for rank, (kmer1, kmer2) in enumerate(arcs):
+        firsts, kmers1, kmers2 = arc_shards[shard_of(kmer2, n_shards)]
+        firsts.append(base + rank)
+        kmers1.append(kmer1)
+        kmers2.append(kmer2)
+    for shard in range(n_shards):
+        save_arrays(shard_path(directory, 'kmers', part, shard), kmer_shards[shard])
+        save_arrays(shard_path(directory, 'arcs', part, shard), arc_shards[shard])
+
+
+def merge_shard(args):
+    """Merge one shard from every slice, given in read order.
+
+    Writes the shard's distinct k-mers by first appearance with their
+    counts, the node ids of the shard in that order, and sends every arc
+    entering the shard on to the shard of the k-mer it leaves, with the
+    position and count of the k-mer it enters. Returns the number of
+    k-mers of the shard.
+    """
+    shard, n_parts, n_shards, directory = args
+    first, counts, arc_first = {}, Counter(), {}
+    # later slices first, so the earliest appearance is the one kept
+    for part in reversed(range(n_parts)):
+        firsts, kmers, part_counts = load_arrays(shard_path(directory, 'kmers', part, shard), 'QQQ')
+        first.update(zip(kmers, firsts))
+        counts.update(dict(zip(kmers, part_counts)))
+        firsts, kmers1, kmers2 = load_arrays(shard_path(directory, 'arcs', part, shard), 'QQQ')
+        arc_first.update(zip(zip(kmers1, kmers2), firsts))
+        os.remove(shard_path(directory, 'kmers', part, shard))
+        os.remove(shard_path(directory, 'arcs', part, shard))
+
+    kmers = sorted(first, key=first.get)
+    position = dict(zip(kmers, range(len(kmers))))
+    save_arrays(shard_path(directory, 'nodes', shard, shard),
+                (array('Q', kmers), array('I', map(counts.__getitem__, kmers))))
+
+    out = [(array('Q'), array('Q'), array('I'), array('I')) for _ in range(n_shards)]
+    for (kmer1, kmer2), rank in arc_first.items():
+        firsts, kmers1, positions, child_counts = out[shard_of(kmer1, n_shards)]
+        firsts.append(rank)
+        kmers1.append(kmer1)
+        positions.append(position[kmer2])
+        child_counts.append(counts[kmer2])
+    for source in range(n_shards):
+        save_arrays(shard_path(directory, 'entering', shard, source), out[source])
+    return len(kmers)
+
+
+def shard_children(args):
+    """Children CSR of one shard, with node ids, and the parents of its arcs sent to the shards they enter.
+
+    Children are sorted by count, ties by first appearance of the arc.
+    """
+    shard, bases, directory = args
+    kmers, _ = load_arrays(shard_path(directory, 'nodes', shard, shard), 'QI')
+    position = dict(zip(kmers, range(len(kmers))))
+    arcs = []
+    for child_shard, base in enumerate(bases[:-1]):
+        path = shard_path(directory, 'entering', child_shard, shard)
+        firsts, kmers1, positions, child_counts = load_arrays(path, 'QQII')
+        os.remove(path)
+        sources = array('I', map(position.__getitem__, kmers1))
+        arcs.extend(zip(sources, (-count for count in child_counts), firsts, map(base.__add__, positions)))
+        # the arcs entering child_shard, as (position of the child, id of the parent)
+        save_arrays(shard_path(directory, 'parents', shard, child_shard),
+                    (positions, array('I', map(bases[shard].__add__, sources))))
+    arcs.sort()
+
+    offsets, targets = array('I', bytes(4 * (len(kmers) + 1))), array('I', [arc[3] for arc in arcs])
+    for source, _, _, _ in arcs:
+        offsets[source + 1] += 1
+    for i in range(len(kmers)):
+        offsets[i + 1] += offsets[i]
+    save_arrays(shard_path(directory, 'children', shard, shard), (offsets, targets))
+
+
+def shard_parents(args):
+    """Parents CSR of one shard, parents of a node in increasing id order"""
+    shard, n_shards, size, directory = args
+    arcs = []
+    for parent_shard in range(n_shards):
+        path = shard_path(directory, 'parents', parent_shard, shard)
+        positions, parents = load_arrays(path, 'II')
+        os.remove(path)
+        arcs.extend(zip(positions, parents))
+    arcs.sort()
+
+    offsets, sources = array('I', bytes(4 * (size + 1))), array('I', [arc[1] for arc in arcs])
+    for position, _ in arcs:
+        offsets[position + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    save_arrays(shard_path(directory, 'parent_csr', shard, shard), (offsets, sources))
+
+
+def iter_slices(data_list, slice_size=SLICE_SIZE):
+    """Contiguous slices of at most slice_size reads, reads may be lists or streams"""
+    reads = []
+    for data in data_list:
+        for read in data:
+            reads.append(read)
+            if len(reads) == slice_size:
+                yield reads
+                reads = []
+    if reads:
+        yield reads
+
+
+def append_csr(offsets, values, shard_offsets, shard_values):
+    """Append the CSR of a shard to the whole graph's, moving its offsets past the values already there"""
+    offsets.extend(map(len(values).__add__, shard_offsets[1:]))
+    values.extend(shard_values)
+
+
+def build_parallel(k, data_list, workers, tmp_dir=None):
+    """FrozenDBG of the graph DBG(k, data_list) builds, built in workers processes.
+
+    The graph stays sharded by shard_of: shard j owns a contiguous range
+    of node ids, its k-mers in order of first appearance, and every step
+    runs on one shard at a time in a worker, the shards passing arrays
+    through files. Workers count slices of the reads, merge each shard's
+    counts and resolve the k-mers an arc enters, then build each shard's
+    children and parents. The parent process only reads the reads and
+    concatenates the shards' arrays. Counts and children match the
+    serial build k-mer for k-mer. Node ids follow the shards, and
+    children of equal count are in order of first appearance rather than
+    DBG's, so contigs can differ from DBG's where paths tie.
+    """
+    from dbg_frozen import FrozenDBG
+
+    if k > 32:
+        raise ValueError('parallel build packs k-mers into 64-bit words, k must be <= 32')
+    with tempfile.TemporaryDirectory(prefix='dbg-shards-', dir=tmp_dir) as directory, Pool(workers) as pool:
+        # slices are cut as the reads stream in
+        n_parts = 0
+        for _ in pool.imap(count_slice, ((k, part, reads, workers, directory)
+                                         for part, reads in enumerate(iter_slices(data_list)))):
+            n_parts += 1
+        sizes = pool.map(merge_shard, [(shard, n_parts, workers, directory) for shard in range(workers)],
+                         chunksize=1)
+        bases = [0]
+        for size in sizes:
+            bases.append(bases[-1] + size)
+        pool.map(shard_children, [(shard, bases, directory) for shard in range(workers)], chunksize=1)
+        pool.map(shard_parents, [(shard, workers, sizes[shard], directory) for shard in range(workers)],
+                 chunksize=1)
+
+        kmers, counts = array('Q'), array('I')
+        offsets, targets, parent_offsets, sources = array('I', [0]), array('I'), array('I', [0]), array('I')
+        for shard in range(workers):
+            shard_kmers, shard_counts = load_arrays(shard_path(directory, 'nodes', shard, shard), 'QI')
+            kmers.extend(shard_kmers)
+            counts.extend(shard_counts)
+            append_csr(offsets, targets, *load_arrays(shard_path(directory, 'children', shard, shard), 'II'))
+            append_csr(parent_offsets, sources,
+                       *load_arrays(shard_path(directory, 'parent_csr', shard, shard), 'II'))
+    return FrozenDBG.from_arrays(k, kmers, counts, offsets, targets, parent_offsets, sources)
@@ -0,0 +1,119 @@
+TIP_LENGTH = 50
+BUBBLE_LENGTH = 50
+# a tip or bubble branch goes when its mean count is below this fraction of the one it competes with
+COVERAGE_RATIO = 0.5
+ROUNDS = 3
+
+
+def only(items):
+    for item in items:
+        return item
+
+
+def walk_chain(nodes, idx, forward, max_length):
+    """Non-branching chain starting at idx, and the node it runs into.
+
+    Follows children (forward) or parents while the next node has a
+    single way in and out, returns (chain, end) where end is the first
+    branching node, or None at a dead end or past max_length nodes.
+    """
+    chain = [idx]
+    while len(chain) <= max_length:
+        node = nodes[chain[-1]]
+        steps = node._children if forward else node._parents
+        if len(steps) != 1:
+            return chain, None
+        nxt = only(steps)
+        after = nodes[nxt]
+        if len(after._parents if forward else after._children) > 1:
+            return chain, nxt
+        if len(after._children if forward else after._parents) != 1:
+            # nxt branches the other way or is a dead end, the chain is no tip
+            return chain, None
+        chain.append(nxt)
+    return chain, None
+
+
+def mean_count(nodes, chain):
+    return sum(nodes[idx].get_count() for idx in chain) / len(chain)
+
+
+def find_tips(nodes, tip_length, coverage_ratio):
+    """Dead-end chains of at most tip_length nodes, weakly covered next to the node they join"""
+    tips = []
+    for idx, node in nodes.items():
+        # a source tip runs forward into a junction, a sink tip backward
+        for forward, ways_in in ((True, node._parents), (False, node._children)):
+            if ways_in:
+                continue
+            chain, junction = walk_chain(nodes, idx, forward, tip_length)
+            if junction is None or len(chain) > tip_length:
+                continue
+            if mean_count(nodes, chain) < coverage_ratio * nodes[junction].get_count():
+                tips.append(chain)
+    return tips
+
+
+def find_bubbles(nodes, bubble_length, coverage_ratio):
+    """Branches of simple bubbles to pop.
+
+    From every node with several children, each child's non-branching
+    chain is followed to the node it merges into, branches merging into
+    the same node form a bubble, and all but the best covered one go when
+    they are weakly covered next to it.
+    """
+    popped = []
+    for node in nodes.values():
+        if len(node._children) < 2:
+            continue
+        by_end = {}
+        for child in node._children:
+            if len(nodes[child]._parents) != 1:
+                continue
+            chain, end = walk_chain(nodes, child, True, bubble_length)
+            if end is not None and len(chain) <= bubble_length:
+                by_end.setdefault(end, []).append(chain)
+        for branches in by_end.values():
+            if len(branches) < 2:
+                continue
+            best = max(mean_count(nodes, chain) for chain in branches)
+            popped.extend(chain for chain in branches if mean_count(nodes, chain) < coverage_ratio * best)
+    return popped
+
+
+def count_edges(nodes):
+    return sum(len(node._children) for node in nodes.values())
+
+
+def simplify(dbg, tip_length=TIP_LENGTH, bubble_length=BUBBLE_LENGTH, coverage_ratio=COVERAGE_RATIO,
+             rounds=ROUNDS):
+    """Remove tips and pop bubbles, a few rounds as removals expose new ones.
+
+    Each round walks every node a bounded number of steps, so it is
+    linear in the graph size. Nodes go through DBG._delete_path, which
+    keeps the parents index and any longest path state consistent.
+    Returns what was removed.
+    """
+    nodes = dbg.nodes
+    n_nodes, n_edges = len(nodes), count_edges(nodes)
+    stats = {'tips': 0, 'bubbles': 0}
+    for _ in range(rounds):
+        tips = find_tips(nodes, tip_length, coverage_ratio)
+        removed = set()
+        for chain in tips:
+            removed.update(chain)
+        if removed:
+            dbg._delete_path(list(removed))
+        bubbles = find_bubbles(nodes, bubble_length, coverage_ratio)
+        popped = set()
+        for chain in bubbles:
+            popped.update(chain)
+        if popped:
+            dbg._delete_path(list(popped))
+        stats['tips'] += len(tips)
+        stats['bubbles'] += len(bubbles)
+        if not removed and not popped:
+            break
+    stats['nodes_removed'] = n_nodes - len(nodes)
+    stats['edges_removed'] = n_edges - count_edges(nodes)
+    return stats
@@ -0,0 +1,149 @@
+from dbg import DBG
+from kmer import decode, last_base
+
+
+class Unitig:
+    """Maximal non-branching path of a DBG, stored as one node.
+
+    Its id, count and parents are those of its first k-mer, its children
+    those of its last k-mer, and it weighs length k-mers in the depth DP.
+    Children are the last k-mer's set itself, so they iterate in the same
+    order and are rebuilt the same way, and tie breaking matches the
+    k-mer graph.
+    """
+    __slots__ = ('_children', '_parents', '_count', 'seq', 'length', 'epoch', 'depth', 'max_depth_child', 'cyclic',
+                 'rebuilt')
+
+    def __init__(self, seq, length, count, children, parents):
+        self._children = children
+        self._parents = parents
+        self._count = count
+        self.seq = seq
+        self.length = length
+        self.epoch = -1
+        self.depth = 0
+        self.max_depth_child = None
+        self.cyclic = False
+        self.rebuilt = 0
+
+    def reset(self):
+        self.epoch = -1
+        self.depth = 0
+        self.max_depth_child = None
+
+    def get_count(self):
+        return self._count
+
+    def get_children(self):
+        return list(self._children)
+
+    def get_parents(self):
+        return list(self._parents)
+
+    def remove_child(self, idx):
+        self._children.discard(idx)
+
+    def remove_parent(self, idx):
+        self._parents.remove(idx)
+
+
+def internal_child(nodes, idx):
+    """The child idx is merged with, if idx has one child and that child one parent"""
+    children = nodes[idx].get_children()
+    if len(children) == 1 and children[0] != idx and len(nodes[children[0]].get_parents()) == 1:
+        return children[0]
+    return None
+
+
+def split_at_lower_ids(members):
+    """Cut a unitig wherever a k-mer has a lower id than the first k-mer of its piece.
+
+    DBG's depth DP visits ids in order, so it can enter a unitig in the
+    middle and, on a cycle, come back to its start while the rest is still
+    on the stack. With every piece starting at its lowest id the DP enters
+    pieces only at their first k-mer, exactly as it walks the k-mer graph.
+    """
+    pieces = [[members[0]]]
+    for idx in members[1:]:
+        if idx < pieces[-1][0]:
+            pieces.append([idx])
+        else:
+            pieces[-1].append(idx)
+    return pieces
+
+
+def unitig_members(nodes):
+    """Lists of k-mer ids of every unitig, first k-mer first, in order of first k-mer id.
+
+    A cycle with no way in starts at its lowest id, where the depth DP
+    of the k-mer graph enters it.
+    """
+    next_of = {}
+    for idx in nodes:
+        child = internal_child(nodes, idx)
+        if child is not None:
+            next_of[idx] = child
+    merged = set(next_of.values())
+
+    unitigs, assigned = {}, set()
+    for head in nodes:
+        if head in merged:
+            continue
+        unitigs[head] = members = [head]
+        while members[-1] in next_of:
+            members.append(next_of[members[-1]])
+        assigned.update(members)
+    for head in nodes:
+        if head in assigned:
+            continue
+        unitigs[head] = members = [head]
+        while next_of[members[-1]] != head:
+            members.append(next_of[members[-1]])
+        assigned.update(members)
+    pieces = [piece for members in unitigs.values() for piece in split_at_lower_ids(members)]
+    pieces.sort()
+    return pieces
+
+
+class UnitigDBG(DBG):
+    """DBG with every maximal non-branching path collapsed into a Unitig.
+
+    The longest path DP, its incremental updates and path deletion are
+    the ones of DBG, a node adding its length instead of 1 to the depth,
+    so contigs are the same with far fewer nodes to visit.
+    """
+
+    def __init__(self, dbg):
+        self.k = dbg.k
+        self.nodes = {}
+        self.epoch = 0
+        self._stale = None
+        self._stale_bound = 0
+        self._depth_heap = []
+        self._deletions = 0
+        self._tied = set()
+
+        nodes = dbg.nodes
+        unitigs = unitig_members(nodes)
+        unitig_of = {}
+        for members in unitigs:
+            for idx in members:
+                unitig_of[idx] = members[0]
+        for members in unitigs:
+            head, tail = nodes[members[0]], nodes[members[-1]]
+            # a child of the last k-mer starts its unitig, a copy of the set could iterate in another order
+            dbg._sync_children(tail)
+            seq = [decode(head.kmer, self.k)]
+            seq.extend(last_base(nodes[idx].kmer) for idx in members[1:])
+            self.nodes[members[0]] = Unitig(''.join(seq), len(members), head.get_count(),
+                                            tail._children,
+                                            [unitig_of[parent] for parent in head.get_parents()])
+
+    def _concat_path(self, path):
+        if len(path) < 1:
+            return None
+        concat = [self.nodes[path[0]].seq]
+        for i in range(1, len(path)):
+            # consecutive unitigs overlap by k - 1 bases
+            concat.append(self.nodes[path[i]].seq[self.k - 1:])
+        return ''.join(concat)
@@ -0,0 +1,250 @@
+import gzip
+import io
+import os
+import posixpath
+import zipfile
+from functools import partial
+from itertools import chain
+from queue import Full, Queue
+from threading import Event, Thread
+
+BATCH_SIZE = 4096
+# batches a background reader may decompress ahead of the graph build
+PREFETCH_DEPTH = 4
+# seconds a blocked background reader waits before checking the consumer is still there
+PUT_TIMEOUT = 0.1
+EXTENSIONS = ('.fasta', '.fa', '.fastq', '.fq')
+
+
+def open_text(path):
+    """Open a text file, decompressing it on the fly if it ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt')
+    return open(path, 'r')
+
+
+def iter_fasta(lines):
+    """Sequences of FASTA records, a record may span several lines"""
+    seq = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line[0] == '>':
+            if seq:
+                yield ''.join(seq)
+            seq = []
+        elif seq is not None:
+            seq.append(line)
+    if seq:
+        yield ''.join(seq)
+
+
+def iter_fastq(lines):
+    """Sequences of FASTQ records, the quality is skipped.
+
+    A record cut short before its '+' line or its full quality raises
+    ValueError naming the record.
+    """
+    lines = iter(lines)
+    for header in lines:
+        if not header.strip():
+            continue
+        seq = []
+        for line in lines:
+            if line[0] == '+':
+                break
+            seq.append(line.strip())
+        else:
+            raise ValueError('truncated FASTQ record %s: no + line' % header.strip())
+        seq = ''.join(seq)
+        # the quality can wrap like the sequence, it has the same length
+        qual = 0
+        while qual < len(seq):
+            line = next(lines, None)
+            if line is None:
+                raise ValueError('truncated FASTQ record %s: %d of %d quality characters'
+                                 % (header.strip(), qual, len(seq)))
+            qual += len(line.strip())
+        yield seq
+
+
+def iter_records(f):
+    """Sequences of a FASTA or FASTQ stream, told apart by the first character"""
+    for first in f:
+        if first.strip():
+            break
+    else:
+        return
+    records = iter_fastq if first[0] == '@' else iter_fasta
+    yield from records(chain([first], f))
+
+
+def batches(f, batch_size=BATCH_SIZE):
+    """Sequences of an open FASTA/FASTQ stream in lists of at most batch_size"""
+    batch = []
+    for seq in iter_records(f):
+        batch.append(seq)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_batches(path, batch_size=BATCH_SIZE):
+    """Read a FASTA/FASTQ file, optionally gzipped, in lists of at most batch_size sequences"""
+    with open_text(path) as f:
+        yield from batches(f, batch_size)
+
+
+def iter_member_batches(archive, member, batch_size=BATCH_SIZE):
+    """Read a FASTA/FASTQ member of a zip archive without extracting it"""
+    with zipfile.ZipFile(archive) as z, z.open(member) as raw:
+        if member.endswith('.gz'):
+            raw = gzip.GzipFile(fileobj=raw)
+        yield from batches(io.TextIOWrapper(raw, encoding='ascii'), batch_size)
+
+
+def prefetch(batch_iter, depth=PREFETCH_DEPTH):
+    """Run a batch iterator in a background thread, up to depth batches ahead.
+
+    Decompression and parsing then overlap with whatever consumes the
+    batches, errors are raised in the consumer. A consumer that stops
+    early, or closes the generator, stops the thread and closes batch_iter.
+    """
+    queue = Queue(maxsize=depth)
+    stop = Event()
+
+    def put(item):
+        # False once the consumer has stopped, a full queue is never drained then
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for batch in batch_iter:
+                if not put(batch):
+                    return
+        except Exception as error:
+            put(error)
+        else:
+            put(None)
+        finally:
+            close = getattr(batch_iter, 'close', None)
+            if close is not None:
+                close()
+
+    Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            batch = queue.get()
+            if batch is None:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+
+
+def flatten(batch_iter):
+    """One sequence at a time out of a batch iterator"""
+    for batch in batch_iter:
+        yield from batch
+
+
+class ReadStream:
+    """Reads of one input, read again from the start on every iteration.
+
+    name is the file or archive member read, nbytes its size on disk,
+    compressed size for an archive member, and stem the input it is in
+    its dataset, such as short_1 or long.
+    """
+
+    def __init__(self, open_batches, name=None, nbytes=None, stem=None):
+        self._open_batches = open_batches
+        self.name = name
+        self.nbytes = nbytes
+        self.stem = stem
+
+    def __iter__(self):
+        return flatten(prefetch(self._open_batches()))
+
+
+def iter_reads(path, batch_size=BATCH_SIZE):
+    """Read a FASTA/FASTQ file one sequence at a time, holding at most one batch"""
+    return flatten(iter_batches(path, batch_size))
+
+
+def input_names(stem):
+    """File names stem may have, any FASTA/FASTQ extension, gzipped or not"""
+    return [stem + ext + suffix for ext in EXTENSIONS for suffix in ('', '.gz')]
+
+
+def find_input(directory, stem):
+    """Path of stem in directory, or None"""
+    for name in input_names(stem):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def find_member(names, stem):
+    """Member of a zip archive holding stem, in any folder of the archive, or None"""
+    by_base = {posixpath.basename(name): name for name in names}
+    for name in input_names(stem):
+        if name in by_base:
+            return by_base[name]
+    return None
+
+
+def read_dataset(path, required=('short_1', 'short_2'), optional=('long',)):
+    """Read streams of a dataset, optional inputs that are missing are skipped.
+
+    path is a dataset directory, or a zip archive (with or without its
+    .zip) whose members are read without extracting them. Every stream is
+    a ReadStream, decompressed and parsed in a background thread, and can
+    be iterated more than once.
+    """
+    if os.path.isdir(path):
+        def find(stem):
+            return find_input(path, stem)
+
+        def open_batches(name):
+            return iter_batches(name)
+
+        def size(name):
+            return os.path.getsize(name)
+    else:
+        archive = path if path.endswith('.zip') else path + '.zip'
+        if not os.path.isfile(archive):
+            raise FileNotFoundError('no dataset directory or archive at %s' % path)
+        with zipfile.ZipFile(archive) as z:
+            sizes = {info.filename: info.compress_size for info in z.infolist()}
+        names = list(sizes)
+
+        def find(stem):
+            return find_member(names, stem)
+
+        def open_batches(name):
+            return iter_member_batches(archive, name)
+
+        def size(name):
+            return sizes[name]
+
+    streams = []
+    for stem in required + optional:
+        name = find(stem)
+        if name is None:
+            if stem in required:
+                raise FileNotFoundError('no %s input in %s' % (stem, path))
+            continue
+        streams.append(ReadStream(partial(open_batches, name), name, size(name), stem))
+    return streams
@@ -0,0 +1,124 @@
+BASE2BIT = {'A': 0, 'C': 1, 'G': 2, 'T': 3}
+BIT2BASE = 'ACGT'
+WORD_BITS = 64
+# k-mers encode_read takes out of one parsed int, shifting an int costs its length
+ENCODE_WINDOW = 256
+# translation tables over whole reads, str and bytes: bases to their base-4
+# digit, to the digit of their complement, and to their complement
+DIGITS = str.maketrans('ACGT', '0123')
+COMPLEMENT_DIGITS = str.maketrans('ACGT', '3210')
+COMPLEMENT = str.maketrans('ACGT', 'TGCA')
+BYTE_DIGITS = bytes.maketrans(b'ACGT', b'0123')
+BYTE_COMPLEMENT_DIGITS = bytes.maketrans(b'ACGT', b'3210')
+BYTE_COMPLEMENT = bytes.maketrans(b'ACGT', b'TGCA')
+# deletes the bases, what is left of a read is not ACGT
+NOT_BASES = str.maketrans('', '', 'ACGT')
+
+
+def kmer_mask(k):
+    """Mask covering the 2k low bits of a packed k-mer"""
+    return (1 << (2 * k)) - 1
+
+
+def encode(kmer):
+    """Pack a k-mer string into an int, 2 bits per base, first base highest"""
+    code = 0
+    for base in kmer:
+        code = (code << 2) | BASE2BIT[base]
+    return code
+
+
+def decode(code, k):
+    """Unpack a k-mer int back into its string"""
+    bases = [''] * k
+    for i in range(k - 1, -1, -1):
+        bases[i] = BIT2BASE[code & 3]
+        code >>= 2
+    return ''.join(bases)
+
+
+def last_base(code):
+    """Last base of a packed k-mer"""
+    return BIT2BASE[code & 3]
+
+
+def reverse_complement(code, k):
+    """Reverse complement of a packed k-mer (complement of b is 3 - b)"""
+    rc = 0
+    for _ in range(k):
+        rc = (rc << 2) | (3 - (code & 3))
+        code >>= 2
+    return rc
+
+
+def reverse_complement_seq(seq):
+    """Reverse complement of a read, str or bytes, with one translate and one reversed copy"""
+    if isinstance(seq, str):
+        return seq.translate(COMPLEMENT)[::-1]
+    return bytes(seq).translate(BYTE_COMPLEMENT)[::-1]
+
+
+def encode_read(seq, k):
+    """Packed code of every k-mer of a read and of its reverse complement.
+
+    Returns (fwd, rev), where fwd[p] is the code of seq[p:p + k] and
+    rev[p] is the code of its reverse complement. seq is a str or a
+    bytes-like buffer. The read is translated to base-4 digits, and every
+    ENCODE_WINDOW k-mers, with the k - 1 bases they overlap the next, are
+    parsed as one int, in C. Each k-mer is a shift and a mask of its
+    window's int, so nothing is allocated per base and shifts stay short
+    however long the read. A base other than ACGT raises ValueError.
+    """
+    length = len(seq)
+    n = length - k + 1
+    if n <= 0:
+        return [], []
+    # int(..., 4) would also take the digits themselves, '_' and whitespace
+    if isinstance(seq, str):
+        if seq.translate(NOT_BASES):
+            raise ValueError('reads may only contain A, C, G and T')
+        digits, rc_digits = seq.translate(DIGITS), seq.translate(COMPLEMENT_DIGITS)
+    else:
+        seq = bytes(seq)
+        if seq.translate(None, b'ACGT'):
+            raise ValueError('reads may only contain A, C, G and T')
+        digits, rc_digits = seq.translate(BYTE_DIGITS), seq.translate(BYTE_COMPLEMENT_DIGITS)
+    mask = kmer_mask(k)
+    rc_digits = rc_digits[::-1]
+    fwd, rev = [], []
+    for start in range(0, n, ENCODE_WINDOW):
+        end = min(n, start + ENCODE_WINDOW)
+        # k-mers start..end - 1 and their reverse complements, read from the reversed complement
+        code = int(digits[start:end + k - 1], 4)
+        rc = int(rc_digits[length - end - k + 1:length - start], 4)
+        # the first k-mer is the highest digits of code, the reverse complement of
+        # the k-mer at start + p the lowest but p digits of rc
+        fwd += [(code >> shift) & mask for shift in range(2 * (end - start - 1), -1, -2)]
+        rev += [(rc >> shift) & mask for shift in range(0, 2 * (end - start), 2)]
+    return fwd, rev
+
+
+def n_words(k):
+    """Number of 64-bit words needed to hold a k-mer"""
+    return (2 * k + WORD_BITS - 1) // WORD_BITS
+
+
+def to_words(code, k):
+    """Split a packed k-mer into fixed-width 64-bit words, most significant first.
+
+    Python ints already hold any k, this is for fixed-width storage when k > 32.
+    """
+    word_mask = (1 << WORD_BITS) - 1
+    words = []
+    for _ in range(n_words(k)):
+        words.append(code & word_mask)
+        code >>= WORD_BITS
+    return words[::-1]
+
+
+def from_words(words):
+    """Inverse of to_words"""
+    code = 0
+    for word in words:
+        code = (code << WORD_BITS) | word
+    return code
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Pick k from the k-mer abundance spectra of a sample of the reads"""
+from collections import Counter
+from itertools import islice
+from kmer import reverse_complement_seq
+from fastx import read_dataset
+import argparse
+import re
+import time
+
+# past about 40% of the short read length, reads hold too few k-mers for a genomic peak
+CANDIDATES = (15, 19, 21, 23, 25, 27, 31, 35, 41)
+# every READ_STEP-th read is sampled, skipping reads lowers the coverage and
+# can hide the genomic peak, so by default the sample is of the k-mers: those
+# starting with MOTIF or ending with its reverse complement, a set closed under
+# reverse complement and counted at every occurrence
+READ_STEP = 1
+MOTIF = 'AC'
+# bases sampled at most, split evenly between the inputs
+MAX_BASES = 8_000_000
+
+
+def motif_fraction(motif):
+    """Fraction of random k-mers sampled by motif"""
+    p = 4 ** -len(motif)
+    return 2 * p - p * p
+
+
+def spectra(data_list, candidates=CANDIDATES, step=READ_STEP, motif=MOTIF, max_bases=MAX_BASES):
+    """{k: abundance histogram} of the sampled canonical k-mers of every candidate k.
+
+    The inputs are streamed once and each stops after its share of
+    max_bases. The motif is searched once per read, in C, and the same
+    read positions give the sampled k-mers of every k, so a read costs a
+    few slices per k rather than work for each of its k-mers. A histogram
+    is {count: distinct k-mers}.
+    """
+    starts = re.compile(re.escape(motif))
+    ends = re.compile(re.escape(reverse_complement_seq(motif)))
+    counts = {k: Counter() for k in candidates}
+    share = max_bases // max(1, len(data_list))
+    for data in data_list:
+        bases = 0
+        for read in islice(data, 0, None, step):
+            if bases >= share:
+                break
+            bases += len(read)
+            first = [m.start() for m in starts.finditer(read)]
+            # k-mers ending with the reverse complement end where it does
+            last = [m.end() for m in ends.finditer(read)]
+            n = len(read)
+            for k, kmer_counts in counts.items():
+                kmers = [read[p:p + k] for p in first if p + k <= n]
+                kmers += [read[p - k:p] for p in last if p >= k and read[p - k:p - k + len(motif)] != motif]
+                kmer_counts.update([min(kmer, reverse_complement_seq(kmer)) for kmer in kmers])
+    return {k: Counter(kmer_counts.values()) for k, kmer_counts in counts.items()}
+
+
+def valley(histogram):
+    """Count at the bottom of the valley between the error peak at 1 and the genomic peak.
+
+    1 if the histogram rises from the start, as with error-free reads, and
+    past the largest count if it never rises again, with too little
+    coverage to tell genomic from error k-mers.
+    """
+    if histogram.get(1, 0) <= histogram.get(2, 0):
+        return 1
+    top = max(histogram)
+    rise = next((count for count in range(2, top) if histogram.get(count, 0) < histogram.get(count + 1, 0)), None)
+    if rise is None:
+        return top + 1
+    peak = max(range(rise + 1, top + 1), key=lambda count: histogram.get(count, 0))
+    return min(range(2, peak), key=lambda count: histogram.get(count, 0))
+
+
+def genomic_kmers(histogram, fraction=motif_fraction(MOTIF)):
+    """Estimated number of distinct genomic k-mers.
+
+    Those counted at least valley(histogram) times, plus as many per
+    count below it as at the valley, for the low tail of the genomic
+    peak hidden under the errors, which keeps the estimate from jumping
+    when the valley moves by one.
+    """
+    low = valley(histogram)
+    genomic = sum(n for count, n in histogram.items() if count >= low) + (low - 1) * histogram.get(low, 0)
+    return round(genomic / fraction)
+
+
+def estimate_k(data_list, candidates=CANDIDATES, step=READ_STEP, motif=MOTIF, max_bases=MAX_BASES):
+    """(k, table): the candidate k with the most estimated genomic k-mers.
+
+    table holds (k, valley, genomic k-mers, distinct k-mers) per candidate,
+    from spectra counted in one pass over the sampled reads.
+    """
+    fraction = motif_fraction(motif)
+    table = []
+    for k, histogram in spectra(data_list, candidates, step, motif, max_bases).items():
+        distinct = round(sum(histogram.values()) / fraction)
+        table.append((k, valley(histogram), genomic_kmers(histogram, fraction), distinct))
+    best = max(table, key=lambda row: row[2])
+    return best[0], table
+
+
+def short_reads(data_list):
+    """Inputs other than the long reads, whose errors blur the spectrum, or all if there are only long reads"""
+    short = [data for data in data_list if getattr(data, 'stem', None) != 'long']
+    return short or data_list
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('data', help='dataset directory or zip archive')
+    parser.add_argument('--candidates', type=int, nargs='+', default=list(CANDIDATES))
+    parser.add_argument('--read-step', type=int, default=READ_STEP, help='sample every read-step-th read')
+    parser.add_argument('--motif', default=MOTIF,
+                        help='sample the k-mers starting with this motif or ending with its reverse complement')
+    parser.add_argument('--max-bases', type=int, default=MAX_BASES, help='bases sampled at most')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    start = time.perf_counter()
+    k, table = estimate_k(short_reads(read_dataset(args.data)), args.candidates, args.read_step,
+                          args.motif, args.max_bases)
+    print(f"{'k':>3} {'Valley':>7} {'Genomic':>9} {'Distinct':>9}")
+    for row in table:
+        print(f"{row[0]:>3} {row[1]:>7} {row[2]:>9} {row[3]:>9}")
+    print(f"k={k} in {time.perf_counter() - start:.1f}s")
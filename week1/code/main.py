@@ -1,23 +1,220 @@
-from dbg import DBG
-from utils import read_data
+from backends import BACKENDS, get_backend
+from dbg import DBG, iter_contigs
+from dbg_canonical import CanonicalDBG
+from dbg_instrumented import InstrumentedDBG
+from dbg_multik import build_multi_k, assemble_multi_k
+from dbg_parallel import build_parallel
+from dbg_simplify import TIP_LENGTH, BUBBLE_LENGTH, COVERAGE_RATIO
+from metrics import Metrics
+from n50 import n50
+from fastx import read_dataset
+from kmer_spectrum import CANDIDATES, estimate_k, short_reads
+import argparse
 import sys
 import os
+import time
 
 sys.setrecursionlimit(1000000)
 
 
+def count_threshold(value):
+    """argparse type of a k-mer count threshold, the sketch counts up to 255"""
+    n = int(value)
+    if not 0 < n < 256:
+        raise argparse.ArgumentTypeError('%s is not a count in 1..255' % value)
+    return n
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('data', help='dataset directory or zip archive')
+    parser.add_argument('-k', type=int, nargs='+',
+                        help='k-mer length, several values assemble one graph per k '
+                             'from a single pass over the reads, estimated from a sample of the reads if unset')
+    parser.add_argument('--backend', choices=list(BACKENDS), default='dbg',
+                        help='assembler engine, the other options apply to the default dbg only')
+    parser.add_argument('--contigs', type=int, default=20, help='maximum number of contigs')
+    parser.add_argument('--min-length', type=int,
+                        help='stop at the first contig shorter than this')
+    parser.add_argument('--max-seconds', type=float,
+                        help='start no new contig after this many seconds of extraction')
+    parser.add_argument('--batch', action='store_true',
+                        help='pull several paths out of each longest path DP while no stale '
+                             'node can be deeper, same contigs with fewer recomputes')
+    parser.add_argument('--canonical', action='store_true',
+                        help='store one node per canonical k-mer')
+    parser.add_argument('--numpy', action='store_true',
+                        help='build the graph with numpy straight into the frozen array form')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes building the graph, sharded into a frozen graph')
+    parser.add_argument('--min-count', type=count_threshold, default=1,
+                        help='only keep k-mers counted at least this many times, '
+                             'found with a count-min sketch in a first pass over the reads')
+    parser.add_argument('--screen-long', type=count_threshold, metavar='N',
+                        help='build from the short reads first, then only add long-read k-mers '
+                             'found in the short reads or seen N times in the long reads')
+    parser.add_argument('--max-memory', type=int, metavar='MB',
+                        help='count k-mers in minimizer bucket files on disk, '
+                             'counting as many buckets at once as fit in this budget')
+    parser.add_argument('--normalize', type=count_threshold, metavar='C',
+                        help='collapse duplicate reads and drop reads whose median k-mer count '
+                             'already reaches C before the build')
+    parser.add_argument('--simplify', action='store_true',
+                        help='remove tips and pop bubbles before extracting contigs')
+    parser.add_argument('--tip-length', type=int, default=TIP_LENGTH,
+                        help='longest tip removed, in k-mers')
+    parser.add_argument('--bubble-length', type=int, default=BUBBLE_LENGTH,
+                        help='longest bubble branch popped, in k-mers')
+    parser.add_argument('--coverage-ratio', type=float, default=COVERAGE_RATIO,
+                        help='a tip or branch goes when its mean count is below this fraction of its competitor')
+    parser.add_argument('--frozen', action='store_true',
+                        help='extract contigs from a compact array form of the graph')
+    parser.add_argument('--unitigs', action='store_true',
+                        help='collapse non-branching paths into unitigs before extracting contigs')
+    parser.add_argument('--save', metavar='PATH',
+                        help='write the built graph to a binary file')
+    parser.add_argument('--load', metavar='PATH',
+                        help='memory-map a graph written by --save instead of building one')
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help='save contig extraction to this file after every contig, '
+                             'and resume from it if it exists')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='write build and per-contig metrics of the default build as JSON lines')
+    args = parser.parse_args()
+    multi_k = args.k is not None and len(args.k) > 1
+    if args.backend != 'dbg' and (multi_k or args.canonical or args.numpy or args.workers > 1
+                                  or args.min_count > 1 or args.frozen or args.unitigs or args.save
+                                  or args.load or args.checkpoint or args.metrics or args.batch
+                                  or args.max_memory or args.screen_long is not None or args.simplify
+                                  or args.normalize):
+        parser.error('--backend %s takes no other graph option' % args.backend)
+    if args.batch and (multi_k or args.canonical or args.frozen or args.load or args.checkpoint):
+        parser.error('--batch is only supported by the object graph, with or without --unitigs')
+    if multi_k and (args.canonical or args.numpy or args.min_count > 1 or args.frozen or args.unitigs
+                            or args.max_memory or args.screen_long is not None or args.save or args.load
+                            or args.checkpoint or args.normalize):
+        parser.error('several -k values only support the default build, --workers sets the assembly processes')
+    if args.metrics and (multi_k or args.canonical or args.numpy or args.workers > 1 or args.min_count > 1
+                         or args.max_memory or args.screen_long is not None or args.frozen or args.unitigs
+                         or args.load or args.checkpoint or args.normalize):
+        parser.error('--metrics instruments the default build and contig extraction only')
+    if args.normalize and (args.canonical or args.numpy or args.workers > 1 or args.min_count > 1
+                           or args.max_memory or args.load):
+        parser.error('--normalize only feeds the serial build')
+    if args.canonical and (args.screen_long is not None or args.min_count > 1 or args.workers > 1 or args.numpy
+                           or args.max_memory):
+        parser.error('--canonical builds its own graph without --screen-long, --min-count, --workers, --numpy '
+                     'or --max-memory')
+    if args.canonical and (args.save or args.load or args.checkpoint or args.simplify or args.frozen
+                           or args.unitigs):
+        parser.error('--save, --load, --checkpoint, --simplify, --frozen and --unitigs do not support --canonical')
+    if args.canonical and args.k is not None and args.k[0] % 2 == 0:
+        parser.error('--canonical needs an odd k, an even k has k-mers equal to their reverse complement')
+    if args.workers > 1 and not multi_k and (args.numpy or args.min_count > 1 or args.screen_long is not None
+                                             or args.max_memory or args.simplify or args.unitigs or args.batch):
+        parser.error('--workers builds a frozen graph without --numpy, --min-count, --screen-long, --max-memory, '
+                     '--simplify, --unitigs or --batch')
+    if args.numpy and (args.min_count > 1 or args.screen_long is not None or args.max_memory or args.simplify
+                       or args.unitigs or args.batch):
+        parser.error('--numpy builds a frozen graph without --min-count, --screen-long, --max-memory, '
+                     '--simplify, --unitigs or --batch')
+    if args.simplify and args.load:
+        parser.error('--simplify edits the object graph, a graph from --load is frozen; pass it with --save instead')
+    if args.unitigs and (args.load or args.checkpoint):
+        parser.error('--load and --checkpoint extract contigs from the frozen graph, not unitigs')
+    return args
+
+
 if __name__ == "__main__":
-    argv = sys.argv
-    short1, short2, long1 = read_data(os.path.join('./', argv[1]))
+    args = parse_args()
+    # contigs of data/data1.zip go to data/data1
+    out_dir = os.path.join('./', args.data[:-len('.zip')] if args.data.endswith('.zip') else args.data)
+    os.makedirs(out_dir, exist_ok=True)
+
+    if args.k is None and not args.load:
+        start = time.perf_counter()
+        candidates = CANDIDATES
+        if args.numpy or args.max_memory or args.workers > 1:
+            # these builds pack k-mers into 64-bit words
+            candidates = [k for k in CANDIDATES if k <= 32]
+        k, _ = estimate_k(short_reads(read_dataset(os.path.join('./', args.data))), candidates)
+        print('k=%d estimated in %.1fs' % (k, time.perf_counter() - start))
+        args.k = [k]
 
-    k = 25
-    dbg = DBG(k=k, data_list=[short1, short2, long1])
+    if args.k and len(args.k) > 1:
+        graphs = build_multi_k(args.k, read_dataset(os.path.join('./', args.data)))
+        for k, contigs in zip(args.k, assemble_multi_k(graphs, args.contigs, args.workers)):
+            lengths = [len(c) for c in contigs]
+            print('k=%d N50 %d contigs %d total %d' % (k, n50(lengths), len(lengths), sum(lengths)))
+            with open(os.path.join(out_dir, 'contig_k%d.fasta' % k), 'w') as f:
+                for i, c in enumerate(contigs):
+                    f.write('>contig_%d\n' % i)
+                    f.write(c + '\n')
+        sys.exit()
+
+    if args.load:
+        dbg = DBG.load(args.load)
+    else:
+        k = args.k[0]
+        # reads are streamed from disk or straight out of the zip while the graph is built
+        data_list = read_dataset(os.path.join('./', args.data))
+        if args.backend != 'dbg':
+            dbg = get_backend(args.backend)(k, data_list)
+        elif args.canonical:
+            dbg = CanonicalDBG(k=k, data_list=data_list)
+        elif args.metrics:
+            metrics = Metrics(open(args.metrics, 'w'))
+            dbg = InstrumentedDBG(k=k, data_list=data_list, metrics=metrics)
+        elif args.workers > 1:
+            dbg = build_parallel(k, data_list, args.workers)
+        elif args.numpy:
+            # numpy is only needed for the vectorized build
+            from dbg_numpy import build_vectorized
+            dbg = build_vectorized(k, data_list)
+        else:
+            long_list = None
+            if args.screen_long is not None:
+                long_list = [data for data in data_list if data.stem == 'long']
+                data_list = [data for data in data_list if data.stem != 'long']
+            dbg = DBG(k=k, data_list=data_list, min_count=args.min_count,
+                      max_memory=None if args.max_memory is None else args.max_memory << 20,
+                      long_list=long_list, long_min_count=args.screen_long, target_coverage=args.normalize)
+            if dbg.normalizer is not None:
+                print(dbg.normalizer.report())
+        # a saved graph is the simplified one
+        if args.simplify:
+            print(dbg.simplify(tip_length=args.tip_length, bubble_length=args.bubble_length,
+                               coverage_ratio=args.coverage_ratio))
+        if args.save:
+            dbg.save(args.save)
     # dbg.show_count_distribution()
-    with open(os.path.join('./', argv[1], 'contig.fasta'), 'w') as f:
-        for i in range(20):
-            c = dbg.get_longest_contig()
-            if c is None:
-                break
+    if args.unitigs:
+        dbg = dbg.compact()
+    elif (args.frozen or args.checkpoint) and not args.load:
+        # the object graph is dropped once the arrays are built
+        dbg = dbg.freeze()
+
+    dbg.batch = args.batch
+    contigs = []
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        contigs = dbg.load_state(args.checkpoint)
+        print('resuming after %d contigs' % len(contigs))
+    # contigs are written and flushed as they are found, so readers can start early
+    with open(os.path.join(out_dir, 'contig.fasta'), 'w') as f:
+        for i, c in enumerate(contigs):
+            f.write('>contig_%d\n' % i)
+            f.write(c + '\n')
+        f.flush()
+        for i, c in enumerate(iter_contigs(dbg, args.contigs - len(contigs), args.min_length, args.max_seconds),
+                              len(contigs)):
             print(i, len(c))
+            if args.metrics:
+                metrics.emit(stage='contig', contig=i, length=len(c))
+            contigs.append(c)
+            if args.checkpoint:
+                dbg.save_state(args.checkpoint, contigs)
             f.write('>contig_%d\n' % i)
             f.write(c + '\n')
+            f.flush()
+    if args.metrics:
+        metrics.out.close()
@@ -154,13 +154,14 @@ def read_data(path):
 def main():
     argv = sys.argv
     if len(argv) < 2:
-        print("Usage: codon run main_codon.py <dataset_path>")
+        print("Usage: codon run main_codon.py <dataset_path> [k]")
         sys.exit(1)
     
     dataset_path = './' + argv[1]
     short1, short2, long1 = read_data(dataset_path)
 
-    k = 25
+    # k picked by kmer_spectrum.py can be passed on, Codon does not run its estimator here
+    k = int(argv[2]) if len(argv) > 2 else 25
     dbg = DBG(k=k, data_list=[short1, short2, long1])
     
     output_path = dataset_path + '/contig_codon.fasta'
@@ -28,24 +28,25 @@ def read_data(path):
 
 def reverse_complement(seq):
     """Calculate reverse complement of a DNA sequence"""
-    result = ""
-    for i in range(len(seq) - 1, -1, -1):
-        base = seq[i]
+    # bases go into a list joined once, += copied the whole prefix for every base
+    result = [''] * len(seq)
+    for i in range(len(seq)):
+        base = seq[len(seq) - 1 - i]
         if base == 'A':
-            result += 'T'
+            result[i] = 'T'
         elif base == 'T':
-            result += 'A'
+            result[i] = 'A'
         elif base == 'G':
-            result += 'C'
+            result[i] = 'C'
         elif base == 'C':
-            result += 'G'
+            result[i] = 'G'
         else:
-            result += 'N'
-    return result
+            result[i] = 'N'
+    return ''.join(result)
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: codon run main_codon_simple.py <data_directory>")
+        print("Usage: codon run main_codon_simple.py <data_directory> [k]")
         return
     
     # Read data - fix the path issue
@@ -57,7 +58,7 @@ def main():
     print(f"Read {len(long1)} long sequences")
     
     # Implement a simple De Bruijn Graph algorithm
-    k = 25
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 25
     
     # Build k-mer dictionary
     kmer_dict = {}
@@ -0,0 +1,41 @@
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Counters, maxima and timers, written out as one JSON line per emit"""
+
+    def __init__(self, out):
+        self.out = out
+        self.counters = Counter()
+        self.maxima = {}
+        self.timers = Counter()
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def maximum(self, name, value):
+        if value > self.maxima.get(name, 0):
+            self.maxima[name] = value
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def emit(self, **fields):
+        """Write fields and everything measured since the last emit, then start over"""
+        record = dict(fields)
+        record.update(self.counters)
+        record.update(self.maxima)
+        record.update((name, round(seconds, 6)) for name, seconds in self.timers.items())
+        self.out.write(json.dumps(record) + '\n')
+        self.out.flush()
+        self.counters.clear()
+        self.maxima.clear()
+        self.timers.clear()
@@ -1,71 +1,127 @@
 #!/usr/bin/env python3
+"""Assembly statistics of FASTA contig files, read in one streaming pass"""
+import argparse
+import json
+import sys
+from multiprocessing import Pool
 
-def calculate_n50(fasta_file):
-    """Calculate N50 for a FASTA file of contigs"""
+
+def read_contigs(fasta_file):
+    """Contig lengths and G+C and A+C+G+T base counts, one pass holding one line at a time"""
     lengths = []
-    
+    gc = acgt = 0
+    current_length = None
     with open(fasta_file, 'r') as f:
-        current_length = 0
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            
             if line.startswith('>'):
-                if current_length > 0:
+                if current_length:
                     lengths.append(current_length)
-                    current_length = 0
-            else:
-                current_length += len(line)
-        
-        # Add the last contig
-        if current_length > 0:
-            lengths.append(current_length)
-    
-    if not lengths:
-        return 0
-    
-    # Count number of contigs
-    num_contigs = len(lengths)
-    
-    # Calculate total length
-    total_length = sum(lengths)
-    
-    # Sort lengths in descending order
-    lengths.sort(reverse=True)
-    
-    # Find N50
-    cumulative_length = 0
+                current_length = 0
+                continue
+            line = line.upper()
+            current_length = (current_length or 0) + len(line)
+            g_c = line.count('G') + line.count('C')
+            gc += g_c
+            acgt += g_c + line.count('A') + line.count('T')
+    # Add the last contig
+    if current_length:
+        lengths.append(current_length)
+    return lengths, gc, acgt
+
+
+def nx(lengths, fraction, total=None):
+    """(Nx, Lx): length of the contig, longest first, at which fraction of total is covered, and its rank.
+
+    total defaults to the assembly length, pass the genome size for NGx.
+    Returns (0, 0) if the contigs never cover it.
+    """
+    if total is None:
+        total = sum(lengths)
+    covered = 0
+    for rank, length in enumerate(sorted(lengths, reverse=True), 1):
+        covered += length
+        if covered >= total * fraction:
+            return length, rank
+    return 0, 0
+
+
+def n50(lengths):
+    return nx(lengths, 0.5)[0]
+
+
+def length_histogram(lengths):
+    """Contig counts by power-of-two length bin, keyed by the bin's lower bound"""
+    histogram = {}
     for length in lengths:
-        cumulative_length += length
-        if cumulative_length >= total_length / 2:
-            return length
-    
-    return 0
+        low = 1 << (length.bit_length() - 1)
+        histogram[low] = histogram.get(low, 0) + 1
+    return dict(sorted(histogram.items()))
+
+
+def assembly_stats(fasta_file, genome_size=None):
+    lengths, gc, acgt = read_contigs(fasta_file)
+    total = sum(lengths)
+    n50_length, l50 = nx(lengths, 0.5)
+    stats = {
+        'file': fasta_file,
+        'contigs': len(lengths),
+        'total_length': total,
+        'longest': max(lengths, default=0),
+        'n50': n50_length,
+        'l50': l50,
+        'n90': nx(lengths, 0.9)[0],
+        # area under the Nx curve, the expected contig length at a random base
+        'aun': sum(length * length for length in lengths) / total if total else 0,
+        'gc': gc / acgt if acgt else 0,
+        'histogram': length_histogram(lengths),
+    }
+    if genome_size:
+        stats['ng50'], stats['lg50'] = nx(lengths, 0.5, genome_size)
+    return stats
+
+
+def calculate_n50(fasta_file):
+    """Calculate N50 for a FASTA file of contigs"""
+    return n50(read_contigs(fasta_file)[0])
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('fasta', nargs='+', help='contig FASTA files')
+    parser.add_argument('--genome-size', type=int, help='genome length, to report NG50 and LG50')
+    parser.add_argument('--json', action='store_true', help='print a JSON list with the stats of every file')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes reading the files')
+    return parser.parse_args()
+
 
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) != 2:
-        print(f"Usage: {sys.argv[0]} <fasta_file>")
+    args = parse_args()
+    jobs = [(path, args.genome_size) for path in args.fasta]
+    try:
+        if args.workers > 1 and len(jobs) > 1:
+            with Pool(min(args.workers, len(jobs))) as pool:
+                results = pool.starmap(assembly_stats, jobs)
+        else:
+            results = [assembly_stats(*job) for job in jobs]
+    except OSError as error:
+        print(error, file=sys.stderr)
         sys.exit(1)
-    
-    n50 = calculate_n50(sys.argv[1])
-    print(f"N50: {n50}")
-    
-    # Additional statistics
-    with open(sys.argv[1], 'r') as f:
-        content = f.read()
-        
-    # Count contigs (number of header lines)
-    num_contigs = content.count('>')
-    
-    # Calculate total length (excluding headers and newlines)
-    lines = content.split('\n')
-    total_length = 0
-    for line in lines:
-        if not line.startswith('>') and line:
-            total_length += len(line)
-            
-    print(f"Number of contigs: {num_contigs}")
-    print(f"Total length: {total_length} bp")
\ No newline at end of file
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+        sys.exit()
+    for stats in results:
+        if len(results) > 1:
+            print(stats['file'])
+        print(f"N50: {stats['n50']}")
+        print(f"Number of contigs: {stats['contigs']}")
+        print(f"Total length: {stats['total_length']} bp")
+        print(f"L50: {stats['l50']}")
+        print(f"N90: {stats['n90']}")
+        print(f"auN: {stats['aun']:.1f}")
+        print(f"GC: {stats['gc']:.4f}")
+        if 'ng50' in stats:
+            print(f"NG50: {stats['ng50']}")
@@ -0,0 +1,81 @@
+MASK64 = (1 << 64) - 1
+# odd 64-bit multipliers, one multiply-shift hash per row
+SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+         0xFF51AFD7ED558CCD, 0xC4CEB9FE1A85EC53)
+SKETCH_BITS = 22
+# odd multiplier folding the words of a k-mer longer than 32 bases into one
+FOLD_SEED = 0xBF58476D1CE4E5B9
+
+
+def fold(kmer):
+    """64-bit key of a packed k-mer, every 64-bit word mixed in, a k <= 32 k-mer is its own key"""
+    h = kmer & MASK64
+    kmer >>= 64
+    while kmer:
+        h = ((h * FOLD_SEED) & MASK64) ^ (kmer & MASK64)
+        kmer >>= 64
+    return h
+
+
+def fold_all(kmers):
+    # the rows hash only 64 bits, k-mers sharing their last 32 bases would share every counter
+    if kmers and max(kmers) > MASK64:
+        return list(map(fold, kmers))
+    return kmers
+
+
+class CountMinSketch:
+    """Count-min sketch of packed k-mers.
+
+    depth rows of 2 ** width_bits saturating 8-bit counters. estimate
+    never undercounts, it overcounts when k-mers share counters in every
+    row, which grows as the number of distinct k-mers nears the width.
+    K-mers longer than 32 bases are folded to 64 bits first.
+    """
+
+    def __init__(self, width_bits=SKETCH_BITS, depth=4):
+        assert 0 < depth <= len(SEEDS)
+        self.shift = 64 - width_bits
+        self.rows = [bytearray(1 << width_bits) for _ in range(depth)]
+        self.seeds = SEEDS[:depth]
+
+    def add(self, kmer, count=1):
+        kmer = fold(kmer)
+        for row, seed in zip(self.rows, self.seeds):
+            h = ((kmer * seed) & MASK64) >> self.shift
+            row[h] = min(255, row[h] + count)
+
+    def estimate(self, kmer):
+        kmer = fold(kmer)
+        return min(row[((kmer * seed) & MASK64) >> self.shift] for row, seed in zip(self.rows, self.seeds))
+
+    def add_all(self, kmers, count=1):
+        """add every k-mer of a list, a row at a time"""
+        shift = self.shift
+        kmers = fold_all(kmers)
+        for row, seed in zip(self.rows, self.seeds):
+            for kmer in kmers:
+                h = ((kmer * seed) & MASK64) >> shift
+                row[h] = min(255, row[h] + count)
+
+    def estimate_all(self, kmers):
+        """estimate of every k-mer of a list, a row at a time"""
+        shift = self.shift
+        kmers = fold_all(kmers)
+        return list(map(min, *([row[((kmer * seed) & MASK64) >> shift] for kmer in kmers]
+                               for row, seed in zip(self.rows, self.seeds))))
+
+    def nbytes(self):
+        return sum(len(row) for row in self.rows)
+
+
+if __name__ == "__main__":
+    # k-mers equal in their last 32 bases must not share counters
+    sketch = CountMinSketch(width_bits=16)
+    low = 0x123456789ABCDEF
+    for high in range(1, 200):
+        sketch.add(high << 64 | low)
+    assert sketch.estimate(7 << 64 | low) == 1, 'high bits ignored'
+    assert sketch.estimate_all([7 << 64 | low, 500 << 64 | low]) == [1, 0]
+    assert sketch.estimate(low) == 0
+    print('ok')
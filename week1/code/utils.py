@@ -1,13 +1,9 @@
+from fastx import iter_reads
 import os
 
 
 def read_fasta(path, name):
-    data = []
-    with open(os.path.join(path, name), 'r') as f:
-        for line in f.readlines():
-            line = line.strip()
-            if line[0] != '>':
-                data.append(line)
+    data = list(iter_reads(os.path.join(path, name)))
     print(name, len(data), len(data[0]))
     # print('Sample:', data[0])
     return data
@@ -16,5 +12,6 @@ def read_fasta(path, name):
 def read_data(path):
     short1 = read_fasta(path, "short_1.fasta")
     short2 = read_fasta(path, "short_2.fasta")
-    long1 = read_fasta(path, "long.fasta")
+    # long reads are optional, data4 has none
+    long1 = read_fasta(path, "long.fasta") if os.path.exists(os.path.join(path, "long.fasta")) else []
     return short1, short2, long1
@@ -12,12 +12,11 @@ format_time() {
     printf "%d:%02d" $((seconds/60)) $((seconds%60))
 }
 
-# Function to safely get stats from n50.py output
+# Function to safely get a field of the JSON stats from n50.py --json
 get_stat() {
     local stats="$1"
-    local pattern="$2"
-    local field="$3"
-    echo "$stats" | grep "$pattern" | cut -d' ' -f"$field" 2>/dev/null || echo "N/A"
+    local field="$2"
+    echo "$stats" | python3 -c "import json, sys; print(json.load(sys.stdin)[0]['$field'])" 2>/dev/null || echo "N/A"
 }
 
 # Function to check if a command exists
@@ -60,19 +59,15 @@ printf "%s\n" "-----------------------------------------------------------------
 
 # List of datasets to process
 datasets=("data1" "data2" "data3" "data4")
+# both implementations run with the same k, main.py would otherwise estimate its own
+K=25
 
 for dataset in "${datasets[@]}"; do
     echo "Processing dataset: ${dataset}"
     
-    # Skip if dataset directory doesn't exist
-    if [ ! -d "data/${dataset}" ]; then
-        echo "Skipping ${dataset}: directory not found"
-        continue
-    fi
-    
-    # Check if required input files exist
-    if [ ! -f "data/${dataset}/short_1.fasta" ] || [ ! -f "data/${dataset}/short_2.fasta" ] || [ ! -f "data/${dataset}/long.fasta" ]; then
-        echo "Skipping ${dataset}: missing input files"
+    # Skip if dataset archive doesn't exist, the Python implementation reads it without extracting
+    if [ ! -f "data/${dataset}.zip" ]; then
+        echo "Skipping ${dataset}: archive not found"
         continue
     fi
     
@@ -80,17 +75,17 @@ for dataset in "${datasets[@]}"; do
     echo "Running Python implementation on ${dataset}..."
     python_start_time=$(date +%s)
     
-    if safe_run "python3 code/main.py data/${dataset}" "python_${dataset}.log"; then
+    if safe_run "python3 code/main.py data/${dataset}.zip -k ${K}" "python_${dataset}.log"; then
         python_end_time=$(date +%s)
         python_runtime=$((python_end_time - python_start_time))
         python_runtime_formatted=$(format_time $python_runtime)
         
         # Get Python statistics
         if [ -f "data/${dataset}/contig.fasta" ]; then
-            python_stats=$(python3 code/n50.py "data/${dataset}/contig.fasta" 2>/dev/null || echo "Error getting stats")
-            python_n50=$(get_stat "$python_stats" "N50:" 2)
-            python_num_contigs=$(get_stat "$python_stats" "Number of contigs:" 4)
-            python_total_length=$(get_stat "$python_stats" "Total length:" 3)
+            python_stats=$(python3 code/n50.py --json "data/${dataset}/contig.fasta" 2>/dev/null || echo "Error getting stats")
+            python_n50=$(get_stat "$python_stats" n50)
+            python_num_contigs=$(get_stat "$python_stats" contigs)
+            python_total_length=$(get_stat "$python_stats" total_length)
         else
             echo "Warning: Python contig.fasta not found for ${dataset}"
             python_n50="N/A"
@@ -105,21 +100,29 @@ for dataset in "${datasets[@]}"; do
         printf "%-10s %-10s %-10s %-10s %-10s %-10s\n" "${dataset}" "python" "FAILED" "N/A" "N/A" "N/A"
     fi
     
+    # The Codon implementation reads the extracted folder and opens all three inputs
+    if [ ! -f "data/${dataset}/short_1.fasta" ] || [ ! -f "data/${dataset}/short_2.fasta" ] || [ ! -f "data/${dataset}/long.fasta" ]; then
+        echo "Skipping Codon on ${dataset}: missing input files in data/${dataset}"
+        echo "Completed ${dataset}"
+        echo "----------------------------------------"
+        continue
+    fi
+
     # Run Codon implementation
     echo "Running Codon implementation on ${dataset}..."
     codon_start_time=$(date +%s)
     
-    if safe_run "codon run -release code/main_codon_simple.py data/${dataset}" "codon_${dataset}.log"; then
+    if safe_run "codon run -release code/main_codon_simple.py data/${dataset} ${K}" "codon_${dataset}.log"; then
         codon_end_time=$(date +%s)
         codon_runtime=$((codon_end_time - codon_start_time))
         codon_runtime_formatted=$(format_time $codon_runtime)
         
         # Get Codon statistics
         if [ -f "data/${dataset}/contig_codon.fasta" ]; then
-            codon_stats=$(python3 code/n50.py "data/${dataset}/contig_codon.fasta" 2>/dev/null || echo "Error getting stats")
-            codon_n50=$(get_stat "$codon_stats" "N50:" 2)
-            codon_num_contigs=$(get_stat "$codon_stats" "Number of contigs:" 4)
-            codon_total_length=$(get_stat "$codon_stats" "Total length:" 3)
+            codon_stats=$(python3 code/n50.py --json "data/${dataset}/contig_codon.fasta" 2>/dev/null || echo "Error getting stats")
+            codon_n50=$(get_stat "$codon_stats" n50)
+            codon_num_contigs=$(get_stat "$codon_stats" contigs)
+            codon_total_length=$(get_stat "$codon_stats" total_length)
         else
             echo "Warning: Codon contig_codon.fasta not found for ${dataset}"
             codon_n50="N/A"